@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+
+logger = logging.getLogger(__name__)
+
+ApplyJoins = Callable[[str, List[dict]], Awaitable[None]]
+ApplyLeaves = Callable[[str, List[str]], Awaitable[None]]
+LoadRoom = Callable[[str], Awaitable[Optional[dict]]]
+
+
+class WriteCommittedError(RuntimeError):
+    """The caller's write was applied, but the room could not be read back.
+
+    Retrying the operation would apply it twice.
+    """
+
+
+class RoomWriteBatcher:
+    """Group commit for participant joins and leaves on the same room.
+
+    Operations arriving for a room within ``window`` seconds are applied as
+    one update per run of consecutive joins or leaves (Mongo cannot push
+    and pull the same array in one update), followed by a single read.
+    Every caller gets the room document as it stands after the batch. If a
+    write fails, callers in that run and the runs after it get the error;
+    callers whose runs were already written still get the room, or a
+    ``WriteCommittedError`` when it cannot be read.
+    """
+
+    def __init__(
+        self,
+        apply_joins: ApplyJoins,
+        apply_leaves: ApplyLeaves,
+        load_room: LoadRoom,
+        window: float = 0.005,
+        max_batch: int = 500,
+    ):
+        self.apply_joins = apply_joins
+        self.apply_leaves = apply_leaves
+        self.load_room = load_room
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[str, List[tuple]] = {}
+        self._flushers: Dict[str, asyncio.Task] = {}
+        self._full_flushes: Set[asyncio.Task] = set()
+        self._batches = 0
+        self._operations = 0
+        self._writes = 0
+        self._largest_batch = 0
+
+    async def join(self, room_id: str, participant: dict) -> Optional[dict]:
+        return await self._submit(room_id, "join", participant)
+
+    async def leave(self, room_id: str, name: str) -> Optional[dict]:
+        return await self._submit(room_id, "leave", name)
+
+    async def _submit(self, room_id: str, kind: str, value) -> Optional[dict]:
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending.setdefault(room_id, [])
+        pending.append((kind, value, future))
+        if len(pending) >= self.max_batch:
+            # A full batch goes out right away; a running timer flushes whatever arrives next.
+            task = asyncio.create_task(self._flush(room_id, self._pending.pop(room_id)))
+            self._full_flushes.add(task)
+            task.add_done_callback(self._full_flushes.discard)
+        elif room_id not in self._flushers:
+            self._flushers[room_id] = asyncio.create_task(self._flush_after_window(room_id))
+        return await future
+
+    async def _flush_after_window(self, room_id: str) -> None:
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            del self._flushers[room_id]
+        batch = self._pending.pop(room_id, [])
+        if batch:
+            await self._flush(room_id, batch)
+
+    async def _flush(self, room_id: str, batch: List[tuple]) -> None:
+        self._batches += 1
+        self._operations += len(batch)
+        self._largest_batch = max(self._largest_batch, len(batch))
+        # Operations before this position are written.
+        committed = 0
+        try:
+            while committed < len(batch):
+                kind = batch[committed][0]
+                end = committed
+                while end < len(batch) and batch[end][0] == kind:
+                    end += 1
+                values = [value for _, value, _ in batch[committed:end]]
+                if kind == "join":
+                    await self.apply_joins(room_id, values)
+                else:
+                    await self.apply_leaves(room_id, values)
+                self._writes += 1
+                committed = end
+        except Exception as exc:
+            logger.exception("Group commit for room %s failed", room_id)
+            _fail(batch[committed:], exc)
+            batch = batch[:committed]
+            if not batch:
+                return
+        try:
+            room = await self.load_room(room_id)
+        except Exception as exc:
+            logger.exception("Reading room %s after group commit failed", room_id)
+            error = WriteCommittedError(f"Room {room_id} was updated but could not be read back")
+            error.__cause__ = exc
+            _fail(batch, error)
+            return
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(room)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "batches": self._batches,
+            "operations": self._operations,
+            "writes": self._writes,
+            "largest_batch": self._largest_batch,
+            "pending_rooms": len(self._pending),
+        }
+
+
+def _fail(operations: List[tuple], exc: Exception) -> None:
+    for _, _, future in operations:
+        if not future.done():
+            future.set_exception(exc)
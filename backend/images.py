@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Gera as variantes redimensionadas das imagens das estações e o manifesto
+lido pelo servidor. Roda no build da imagem Docker, não nos workers.
+
+Uso:
+  # com os padrões de STATION_IMAGES_DIR, IMAGE_CACHE_DIR, IMAGE_WIDTHS e IMAGE_FORMATS
+  python images.py build
+
+  # no Dockerfile, com as imagens copiadas para o contexto do build
+  python images.py build --source station_images --output image_cache
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from starlette.staticfiles import StaticFiles
+
+try:
+    from PIL import Image, ImageFilter, ImageOps, features
+except ImportError:  # Pillow is optional: without it stations keep their original URLs
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+IMAGE_URL_PREFIX = "/api/images"
+DEFAULT_WIDTH = 960
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+SAVE_OPTIONS = {
+    "avif": {"format": "AVIF", "quality": 55},
+    "webp": {"format": "WEBP", "quality": 75, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 80, "optimize": True, "progressive": True},
+}
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names embed a content hash, so they never change."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+def supported_formats(requested: Iterable[str]) -> List[str]:
+    formats = []
+    for image_format in requested:
+        image_format = image_format.strip().lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in SAVE_OPTIONS:
+            continue
+        if image_format in ("avif", "webp") and not features.check(image_format):
+            logger.warning("Pillow was built without %s support; skipping it", image_format)
+            continue
+        formats.append(image_format)
+    # JPEG is always produced last as the universal fallback.
+    if "jpeg" not in formats:
+        formats.append("jpeg")
+    return formats
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Never expose a partial file to a server reading the same directory.
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _encode(image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    if image_format == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    image.save(buffer, **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+def _placeholder(image) -> str:
+    tiny = image.convert("RGB")
+    tiny.thumbnail((16, 16))
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    data = _encode(tiny, "jpeg")
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
+
+
+class StationImagePipeline:
+    """Precomputes resized variants and blur placeholders for station artwork.
+
+    Originals are read from ``source_dir``; variants are written to
+    ``output_dir`` with the original's content hash in the file name and
+    served from ``IMAGE_URL_PREFIX`` with immutable caching. ``build`` runs
+    once at image build time (``python images.py build``) and skips images
+    whose hash has not changed; workers only ``load`` the manifest.
+    """
+
+    def __init__(self, source_dir: Path, output_dir: Path, widths: List[int], formats: List[str]):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.widths = sorted(set(widths))
+        self.formats = formats
+        self.manifest: Dict[str, dict] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and self.source_dir.is_dir()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.output_dir / "manifest.json"
+
+    def load(self) -> Dict[str, dict]:
+        """Reads the manifest written by ``build``; missing or invalid means no variants."""
+        try:
+            self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            self.manifest = {}
+        except ValueError:
+            logger.warning("Ignoring invalid image manifest %s", self.manifest_path)
+            self.manifest = {}
+        return self.manifest
+
+    def build(self) -> Dict[str, dict]:
+        if not self.enabled:
+            return self.manifest
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        previous = self.load()
+        formats = supported_formats(self.formats)
+        manifest = {}
+        for source in sorted(self.source_dir.iterdir()):
+            if source.suffix.lower() not in (".jpg", ".jpeg", ".png", ".webp"):
+                continue
+            data = source.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            entry = previous.get(source.name)
+            if (
+                entry
+                and entry.get("hash") == digest
+                and entry.get("formats") == formats
+                and entry.get("widths") == self.widths
+                and all((self.output_dir / Path(variant["url"]).name).exists() for variant in entry["variants"])
+            ):
+                manifest[source.name] = entry
+                continue
+            manifest[source.name] = self._build_one(source.stem, data, digest, formats)
+        _write_atomic(self.manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
+        self.manifest = manifest
+        return manifest
+
+    def _build_one(self, stem: str, data: bytes, digest: str, formats: List[str]) -> dict:
+        with Image.open(io.BytesIO(data)) as opened:
+            image = ImageOps.exif_transpose(opened)
+            image.load()
+        original_width, original_height = image.size
+        widths = [width for width in self.widths if width < original_width] + [original_width]
+        variants = []
+        for width in widths:
+            height = round(original_height * width / original_width)
+            resized = image if width == original_width else image.resize((width, height), Image.LANCZOS)
+            for image_format in formats:
+                extension = "jpg" if image_format == "jpeg" else image_format
+                filename = f"{stem}.{digest}.{width}.{extension}"
+                path = self.output_dir / filename
+                if not path.exists():
+                    _write_atomic(path, _encode(resized, image_format))
+                variants.append(
+                    {
+                        "url": f"{IMAGE_URL_PREFIX}/{filename}",
+                        "width": width,
+                        "height": height,
+                        "format": image_format,
+                        "type": MIME_TYPES[image_format],
+                    }
+                )
+        logger.info("Built %d image variants for %s", len(variants), stem)
+        return {
+            "hash": digest,
+            "formats": formats,
+            "widths": self.widths,
+            "width": original_width,
+            "height": original_height,
+            "placeholder": _placeholder(image),
+            "variants": variants,
+        }
+
+    def lookup(self, image_url: str) -> Optional[dict]:
+        if not self.manifest or not image_url:
+            return None
+        return self.manifest.get(Path(urlparse(image_url).path).name)
+
+    def attach_variants(self, station: dict) -> dict:
+        entry = self.lookup(station.get("image_url", ""))
+        if entry is None:
+            return station
+        station = dict(station)
+        variants = entry["variants"]
+        # Clients that ignore the variant list still get a phone-sized JPEG.
+        fallback = [variant for variant in variants if variant["format"] == "jpeg"]
+        default = [variant for variant in fallback if variant["width"] <= DEFAULT_WIDTH] or fallback
+        station["image_url"] = default[-1]["url"]
+        station["image_width"] = entry["width"]
+        station["image_height"] = entry["height"]
+        station["image_placeholder"] = entry["placeholder"]
+        station["image_variants"] = variants
+        return station
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="gera as variantes e o manifesto")
+    root_dir = Path(__file__).parent
+    build_parser.add_argument("--source", default=os.environ.get("STATION_IMAGES_DIR", root_dir.parent / "frontend" / "public" / "images"))
+    build_parser.add_argument("--output", default=os.environ.get("IMAGE_CACHE_DIR", root_dir / "image_cache"))
+    build_parser.add_argument("--widths", default=os.environ.get("IMAGE_WIDTHS", "320,640,960,1280"))
+    build_parser.add_argument("--formats", default=os.environ.get("IMAGE_FORMATS", "webp,jpeg"))
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    pipeline = StationImagePipeline(
+        source_dir=Path(args.source),
+        output_dir=Path(args.output),
+        widths=[int(width) for width in args.widths.split(",")],
+        formats=args.formats.split(","),
+    )
+    if not pipeline.enabled:
+        reason = "Pillow is not installed" if Image is None else f"{pipeline.source_dir} is not a directory"
+        logger.warning("Skipping station images (%s); stations keep their original URLs", reason)
+        return
+    manifest = pipeline.build()
+    logger.info("Image manifest with %d images written to %s", len(manifest), pipeline.manifest_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+def route_name(scope: dict) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return f"{scope.get('method', '')} {route.path}".strip()
+    return f"{scope.get('method', '')} {scope.get('path', '')}".strip()
+
+
+def format_thread_stack(thread_id: int, limit: int = 30) -> str:
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return ""
+    return "".join(traceback.format_stack(frame, limit=limit))
+
+
+def _percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoopMonitor:
+    """Measures event-loop lag and reports what was blocking it.
+
+    A heartbeat coroutine sleeps for ``interval`` and records how late it
+    wakes up. A watchdog thread notices when the heartbeat stops entirely
+    and captures the loop thread's stack together with the requests in
+    flight, which is what points at the blocking call. The companion
+    middleware flags handlers slower than ``slow_request_threshold``.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        stall_threshold: float = 0.25,
+        slow_request_threshold: float = 1.0,
+        window: int = 600,
+    ):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.slow_request_threshold = slow_request_threshold
+        self.executors: Dict[str, Callable[[], dict]] = {}
+        self._lags = deque(maxlen=window)
+        self._max_lag = 0.0
+        self._stall_count = 0
+        self._slow_request_count = 0
+        self.recent_stalls = deque(maxlen=20)
+        self.recent_slow_requests = deque(maxlen=50)
+        self._in_flight: Dict[int, tuple] = {}
+        self._last_beat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def register_executor(self, name: str, stats: Callable[[], dict]) -> None:
+        self.executors[name] = stats
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._last_beat = time.monotonic()
+            self._lags.append(lag)
+            self._max_lag = max(self._max_lag, lag)
+            if lag >= self.stall_threshold:
+                logger.warning("Event loop lagged %.1f ms", lag * 1000)
+
+    def _watch(self) -> None:
+        reported_beat = None
+        while not self._stopped.wait(self.interval):
+            last_beat = self._last_beat
+            blocked_for = time.monotonic() - last_beat
+            if blocked_for < self.stall_threshold + self.interval or reported_beat == last_beat:
+                continue
+            # One report per stall: the heartbeat has not moved since last_beat.
+            reported_beat = last_beat
+            self._stall_count += 1
+            stall = {
+                "at": time.time(),
+                "blocked_ms": round(blocked_for * 1000, 1),
+                "in_flight": self.in_flight(),
+                "stack": format_thread_stack(self._loop_thread_id) if self._loop_thread_id else "",
+            }
+            self.recent_stalls.append(stall)
+            logger.warning(
+                "Event loop blocked for %.1f ms; in flight: %s\n%s",
+                stall["blocked_ms"],
+                ", ".join(request["route"] for request in stall["in_flight"]) or "-",
+                stall["stack"],
+            )
+
+    def request_started(self, scope: dict) -> int:
+        token = id(scope)
+        self._in_flight[token] = (scope, time.perf_counter())
+        return token
+
+    def request_finished(self, token: int) -> None:
+        scope, started = self._in_flight.pop(token, (None, None))
+        if scope is None:
+            return
+        duration = time.perf_counter() - started
+        if duration >= self.slow_request_threshold:
+            self._slow_request_count += 1
+            route = route_name(scope)
+            self.recent_slow_requests.append(
+                {"at": time.time(), "route": route, "duration_ms": round(duration * 1000, 1)}
+            )
+            logger.warning("Slow handler %s took %.1f ms", route, duration * 1000)
+
+    def in_flight(self) -> list:
+        now = time.perf_counter()
+        # Called from the watchdog thread too; copy before iterating.
+        entries = list(self._in_flight.copy().values())
+        return [
+            {"route": route_name(scope), "elapsed_ms": round((now - started) * 1000, 1)}
+            for scope, started in entries
+        ]
+
+    def executor_stats(self) -> dict:
+        stats = {}
+        default_executor = getattr(self._loop, "_default_executor", None) if self._loop else None
+        if default_executor is not None:
+            stats["default"] = {
+                "workers": default_executor._max_workers,
+                "threads": len(default_executor._threads),
+                "queued": default_executor._work_queue.qsize(),
+            }
+        for name, collect in self.executors.items():
+            stats[name] = collect()
+        return stats
+
+    def summary(self) -> dict:
+        lags = list(self._lags)
+        return {
+            "lag_ms": {
+                "current": round(lags[-1] * 1000, 2) if lags else 0.0,
+                "p50": round(_percentile(lags, 0.5) * 1000, 2),
+                "p99": round(_percentile(lags, 0.99) * 1000, 2),
+                "max": round(self._max_lag * 1000, 2),
+            },
+            "stalls": self._stall_count,
+            "slow_requests": self._slow_request_count,
+            "in_flight": len(self._in_flight),
+            "executors": self.executor_stats(),
+        }
+
+    def is_healthy(self) -> bool:
+        lags = list(self._lags)[-10:]
+        return not lags or max(lags) < self.stall_threshold
+
+
+class LoopMonitorMiddleware:
+    def __init__(self, app, monitor: LoopMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = self.monitor.request_started(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.request_finished(token)
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Tuple
+
+from passlib.context import CryptContext
+
+
+# Room passwords use bcrypt over a SHA-256 pre-hash (bcrypt_sha256), since
+# plain bcrypt ignores everything past the 72nd byte. Hashes from plain
+# bcrypt and the unsalted SHA-256 hex digests of rooms created before the
+# migration still verify, and are rehashed on the next successful login.
+ROOM_PASSWORD_BCRYPT_ROUNDS = int(os.environ.get("ROOM_PASSWORD_BCRYPT_ROUNDS", "10"))
+room_pwd_context = CryptContext(
+    schemes=["bcrypt_sha256", "bcrypt", "hex_sha256"],
+    deprecated=["bcrypt", "hex_sha256"],
+    bcrypt_sha256__rounds=ROOM_PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__rounds=ROOM_PASSWORD_BCRYPT_ROUNDS,
+)
+
+
+def hash_room_password(password: str) -> str:
+    return room_pwd_context.hash(password)
+
+
+def verify_room_password(password: str, password_hash: str) -> Tuple[bool, str]:
+    """Returns (valid, new_hash); new_hash is empty unless the stored hash must be upgraded."""
+    try:
+        valid, new_hash = room_pwd_context.verify_and_update(password, password_hash)
+    except ValueError:
+        return False, ""
+    return valid, new_hash or ""
+
+
+class PasswordHashQueueFull(RuntimeError):
+    pass
+
+
+class PasswordHashExecutor:
+    """Dedicated, bounded pool for CPU-heavy credential checks.
+
+    Keeps KDF work off the event loop and away from the default executor used
+    by ``asyncio.to_thread``. Submissions beyond ``max_pending`` are rejected
+    instead of queued so a join storm degrades into fast 503s, not timeouts.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 256):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="password-hash",
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._peak_pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHashQueueFull("Password hashing queue is full")
+            self._pending += 1
+            self._peak_pending = max(self._peak_pending, self._pending)
+        future: Future = self._executor.submit(self._call, time.perf_counter(), func, args)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _call(self, submitted_at: float, func: Callable[..., Any], args: tuple) -> Any:
+        started_at = time.perf_counter()
+        with self._lock:
+            self._running += 1
+            self._wait_seconds += started_at - submitted_at
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._run_seconds += time.perf_counter() - started_at
+
+    def _release(self, _: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "queued": self._pending - self._running,
+                "running": self._running,
+                "peak_pending": self._peak_pending,
+                "completed": completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_seconds / completed * 1000, 3) if completed else 0.0,
+                "avg_run_ms": round(self._run_seconds / completed * 1000, 3) if completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
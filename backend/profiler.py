@@ -0,0 +1,117 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval.
+
+    Sampling happens on a separate thread that only reads
+    ``sys._current_frames()``, so the profiled event loop keeps serving.
+    Each stack is prefixed with the route whose endpoint is on it, and the
+    result is in collapsed-stack format ("a;b;c count"), ready for
+    flamegraph.pl or speedscope. Only one profile runs at a time, and it
+    stops early when the awaiting request is cancelled.
+    """
+
+    def __init__(self, max_depth: int = 96):
+        self.max_depth = max_depth
+        self.routes: Dict[object, str] = {}
+        self._lock = threading.Lock()
+
+    def register_routes(self, routes) -> None:
+        for route in routes:
+            endpoint = getattr(route, "endpoint", None)
+            code = getattr(endpoint, "__code__", None)
+            if code is None:
+                continue
+            methods = ",".join(sorted(getattr(route, "methods", None) or []))
+            self.routes[code] = f"{methods} {route.path}".strip()
+
+    async def profile(self, thread_id: int, seconds: float, interval: float) -> dict:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        stop = threading.Event()
+
+        def settle(set_outcome, value) -> None:
+            # The future is already cancelled when the client went away.
+            if not future.done():
+                set_outcome(value)
+
+        def run() -> None:
+            try:
+                result = self._sample(thread_id, seconds, interval, stop)
+            except Exception as exc:
+                outcome = (future.set_exception, exc)
+            else:
+                outcome = (future.set_result, result)
+            finally:
+                self._lock.release()
+            try:
+                loop.call_soon_threadsafe(settle, *outcome)
+            except RuntimeError:
+                pass  # the loop closed while sampling
+
+        threading.Thread(target=run, name="sampling-profiler", daemon=True).start()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            stop.set()
+            raise
+
+    def _sample(self, thread_id: int, seconds: float, interval: float, stop: threading.Event) -> dict:
+        stacks: Counter = Counter()
+        samples = 0
+        sampling_time = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_sample = started
+        while not stop.is_set():
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now < next_sample:
+                stop.wait(next_sample - now)
+                continue
+            next_sample += interval
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            labels = []
+            route = None
+            depth = 0
+            while frame is not None and depth < self.max_depth:
+                code = frame.f_code
+                if route is None:
+                    route = self.routes.get(code)
+                labels.append(_frame_label(code))
+                frame = frame.f_back
+                depth += 1
+            del frame
+            labels.reverse()
+            labels.insert(0, f"route:{route}" if route else "route:-")
+            stacks[";".join(labels)] += 1
+            samples += 1
+            sampling_time += time.perf_counter() - now
+        elapsed = time.perf_counter() - started
+        return {
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+            "samples": samples,
+            "elapsed_seconds": round(elapsed, 3),
+            # Share of wall time the sampler itself held the GIL.
+            "overhead": round(sampling_time / elapsed, 5) if elapsed else 0.0,
+        }
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Reexecuta capturas de tráfego (TRAFFIC_CAPTURE_DIR) e compara latências entre builds.
+
+Uso:
+  # contra uma instância local já rodando
+  python replay_traffic.py replay captures/*.jsonl.gz --base-url http://localhost:8000 --out atual.json
+
+  # em processo, com o armazenamento embutido (sem MongoDB)
+  python replay_traffic.py replay captures/*.jsonl.gz --in-process --speed 10 --out atual.json
+
+  # compara duas execuções
+  python replay_traffic.py compare base.json atual.json
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+
+REPLAY_PASSWORD = "replay-password"
+REPLAY_HOST = ("Replay", "Host")
+ADMIN_EMAIL = "replay@example.com"
+
+
+def _capture_epoch(header: dict, first_offset: float) -> float:
+    """Wall-clock time at which the offsets in a capture file start."""
+    if "epoch" in header:
+        return header["epoch"]
+    # Version 1 files only name the second the file was opened, which is when its first record was written.
+    opened = datetime.strptime(header["started_at"], "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc)
+    return opened.timestamp() - first_offset
+
+
+def read_capture(path: str) -> Tuple[Optional[dict], List[dict]]:
+    """Reads a capture file, keeping the records before any truncation.
+
+    Files are only finalized on rotation or shutdown, so the current file of
+    a live worker, or of one that was killed, ends without a gzip trailer.
+    """
+    header = None
+    records = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as capture:
+            for line in capture:
+                if not line.endswith("\n"):
+                    break  # partial last line
+                if header is None:
+                    header = json.loads(line)
+                else:
+                    records.append(json.loads(line))
+    except (EOFError, gzip.BadGzipFile) as exc:
+        print(f"{path}: captura truncada ({exc}); usando {len(records)} registros lidos", file=sys.stderr)
+    return header, records
+
+
+def load_records(paths: List[str]) -> List[dict]:
+    """Merges capture files from any number of workers into one timeline starting at zero."""
+    records = []
+    for path in paths:
+        header, file_records = read_capture(path)
+        if not file_records:
+            continue
+        epoch = _capture_epoch(header, file_records[0]["t"])
+        for record in file_records:
+            record["t"] += epoch
+        records.extend(file_records)
+    records.sort(key=lambda record: record["t"])
+    if records:
+        start = records[0]["t"]
+        for record in records:
+            record["t"] = round(record["t"] - start, 4)
+    return records
+
+
+def collect_room_refs(value, refs: set) -> None:
+    if isinstance(value, dict):
+        if "$ref" in value:
+            refs.add(value["$ref"])
+        for item in value.values():
+            collect_room_refs(item, refs)
+    elif isinstance(value, list):
+        for item in value:
+            collect_room_refs(item, refs)
+
+
+class Replayer:
+    def __init__(self, client: httpx.AsyncClient, speed: float, concurrency: int, admin_password: Optional[str]):
+        self.client = client
+        self.speed = speed
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.admin_password = admin_password
+        self.admin_token: Optional[str] = None
+        self.rooms: Dict[str, Tuple[str, str]] = {}
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.captured: Dict[str, List[float]] = defaultdict(list)
+        self.skipped = 0
+        self._counter = 0
+
+    async def prepare(self, records: List[dict]) -> None:
+        refs = set()
+        for record in records:
+            collect_room_refs(record.get("p"), refs)
+            collect_room_refs(record.get("b"), refs)
+        for ref in sorted(refs):
+            response = await self.client.post(
+                "/api/rooms",
+                json={
+                    "name": f"replay {ref}",
+                    "password": REPLAY_PASSWORD,
+                    "first_name": REPLAY_HOST[0],
+                    "last_name": REPLAY_HOST[1],
+                },
+            )
+            response.raise_for_status()
+            created = response.json()
+            self.rooms[ref] = (created["room_id"], created["host_token"])
+        if self.admin_password:
+            response = await self.client.post(
+                "/api/admin/login",
+                json={"email": os.environ.get("ADMIN_ALLOWED_EMAIL", ADMIN_EMAIL), "password": self.admin_password},
+            )
+            if response.status_code == 200:
+                self.admin_token = response.json()["token"]
+
+    def materialize(self, value, key: Optional[str] = None, room: Optional[Tuple[str, str]] = None):
+        if isinstance(value, dict):
+            if "$ref" in value:
+                return self.rooms[value["$ref"]][0]
+            if "$scrubbed" in value:
+                if key == "host_token" and room:
+                    return room[1]
+                return REPLAY_PASSWORD
+            if "$s" in value:
+                self._counter += 1
+                return f"r{self._counter}".ljust(max(value["$s"], 1), "x")[: max(value["$s"], 1)]
+            if "$bytes" in value:
+                return None
+            return {name: self.materialize(item, name, room) for name, item in value.items()}
+        if isinstance(value, list):
+            return [self.materialize(item, None, room) for item in value]
+        return value
+
+    def build_request(self, record: dict) -> Optional[dict]:
+        route = record["r"]
+        params = record.get("p") or {}
+        room = None
+        for name, value in params.items():
+            if isinstance(value, dict) and "$ref" in value:
+                room = self.rooms[value["$ref"]]
+                value = room[0]
+            if "{" + name + "}" in route:
+                route = route.replace("{" + name + "}", str(value))
+            elif name == "path":
+                # Mounted static files record the mount prefix plus the file path.
+                route = f"{route.rstrip('/')}/{value}"
+        if "{" in route:
+            return None
+        body = record.get("b")
+        if isinstance(body, dict) and isinstance(body.get("room_id"), dict) and "$ref" in body["room_id"]:
+            room = self.rooms[body["room_id"]["$ref"]]
+        json_body = self.materialize(body, room=room) if body is not None else None
+        if record["r"].endswith("/host-login") and isinstance(json_body, dict):
+            json_body["first_name"], json_body["last_name"] = REPLAY_HOST
+        headers = {}
+        if record["r"].startswith("/api/admin/"):
+            if record["r"] == "/api/admin/login" or not self.admin_token:
+                return None
+            headers["Authorization"] = f"Bearer {self.admin_token}"
+        query = {name: self.materialize(value, name, room) for name, value in (record.get("q") or {}).items()}
+        return {"method": record["m"], "url": route, "json": json_body, "params": query, "headers": headers}
+
+    async def send(self, record: dict, request: dict) -> None:
+        route = f"{record['m']} {record['r']}"
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(**request)
+                status = str(response.status_code)
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            self.latencies[route].append((time.perf_counter() - started) * 1000)
+            self.statuses[route][status] += 1
+
+    async def run(self, records: List[dict]) -> None:
+        await self.prepare(records)
+        tasks = []
+        started = time.perf_counter()
+        for record in records:
+            request = self.build_request(record)
+            if request is None:
+                self.skipped += 1
+                continue
+            self.captured[f"{record['m']} {record['r']}"].append(record["d"])
+            delay = record["t"] / self.speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.send(record, request)))
+        await asyncio.gather(*tasks)
+
+    def results(self) -> dict:
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            routes[route] = {
+                "count": len(latencies),
+                "statuses": dict(self.statuses[route]),
+                "replayed_ms": distribution(latencies),
+                "captured_ms": distribution(self.captured[route]),
+            }
+        return {"speed": self.speed, "skipped": self.skipped, "routes": routes}
+
+
+def distribution(values: List[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def percentile(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 3)
+
+    return {
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": round(ordered[-1], 3),
+        "mean": round(sum(ordered) / len(ordered), 3),
+    }
+
+
+async def replay(args) -> dict:
+    records = load_records(args.captures)
+    if args.in_process:
+        # Every run starts from an empty embedded store, never from a snapshot.
+        os.environ["STORAGE_BACKEND"] = "memory"
+        os.environ.pop("STORAGE_SNAPSHOT_PATH", None)
+        os.environ.setdefault("ADMIN_ALLOWED_EMAIL", ADMIN_EMAIL)
+        os.environ.setdefault("ADMIN_PASSWORD", REPLAY_PASSWORD)
+        args.admin_password = args.admin_password or REPLAY_PASSWORD
+        sys.path.insert(0, str(Path(__file__).resolve().parent))
+        import server
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with server.app.router.lifespan_context(server.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=60) as client:
+                replayer = Replayer(client, args.speed, args.concurrency, args.admin_password)
+                await replayer.run(records)
+    else:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+            replayer = Replayer(client, args.speed, args.concurrency, args.admin_password)
+            await replayer.run(records)
+    return replayer.results()
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> int:
+    regressions = 0
+    print(f"{'rota':45} {'p50 base':>10} {'p50 novo':>10} {'p99 base':>10} {'p99 novo':>10} {'Δp99':>8}")
+    for route in sorted(set(baseline["routes"]) | set(candidate["routes"])):
+        before = baseline["routes"].get(route, {}).get("replayed_ms", {})
+        after = candidate["routes"].get(route, {}).get("replayed_ms", {})
+        if not before or not after:
+            print(f"{route:45} {'-':>10} {'-':>10} {'-':>10} {'-':>10} {'n/a':>8}")
+            continue
+        change = (after["p99"] - before["p99"]) / before["p99"] * 100 if before["p99"] else 0.0
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  <- regressão"
+        print(
+            f"{route:45} {before['p50']:>10.2f} {after['p50']:>10.2f} "
+            f"{before['p99']:>10.2f} {after['p99']:>10.2f} {change:>7.1f}%{flag}"
+        )
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = commands.add_parser("replay", help="reexecuta uma captura")
+    replay_parser.add_argument("captures", nargs="+")
+    replay_parser.add_argument("--base-url", default="http://localhost:8000")
+    replay_parser.add_argument("--in-process", action="store_true", help="roda o app neste processo com o armazenamento embutido")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="1 = tempo real, 10 = dez vezes mais rápido")
+    replay_parser.add_argument("--concurrency", type=int, default=200)
+    replay_parser.add_argument("--admin-password", default=os.environ.get("ADMIN_PASSWORD"))
+    replay_parser.add_argument("--out", help="grava o resultado em JSON")
+
+    compare_parser = commands.add_parser("compare", help="compara duas execuções de replay")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=20.0, help="aumento máximo aceito no p99, em %%")
+
+    args = parser.parse_args()
+    if args.command == "replay":
+        results = asyncio.run(replay(args))
+        output = json.dumps(results, indent=2, ensure_ascii=False)
+        if args.out:
+            Path(args.out).write_text(output, encoding="utf-8")
+        print(output)
+    else:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        candidate = json.loads(Path(args.candidate).read_text(encoding="utf-8"))
+        sys.exit(compare(baseline, candidate, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
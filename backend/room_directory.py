@@ -0,0 +1,202 @@
+import asyncio
+import base64
+import bisect
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+_NEVER = datetime.max.replace(tzinfo=timezone.utc)
+
+LoadEntries = Callable[[], Awaitable[List[dict]]]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode_cursor(mode: str, key: tuple) -> str:
+    raw = json.dumps([mode, list(key)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, mode: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_mode, key = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor(cursor) from exc
+    first_type = str if mode == "name" else (int, float)
+    if (
+        cursor_mode != mode
+        or not isinstance(key, list)
+        or len(key) != 2
+        or not isinstance(key[0], first_type)
+        or not isinstance(key[1], str)
+    ):
+        raise InvalidCursor(cursor)
+    return tuple(key)
+
+
+class RoomDirectory:
+    """In-memory directory of active rooms behind the public room list.
+
+    Entries carry room_id, name, name_normalized, created_at, starts_at and
+    expires_at. Two sorted indexes are kept: newest first for the landing
+    page and by normalized name for prefix search. Local writes update the
+    indexes immediately; a periodic reload from the database picks up
+    changes made by other workers. Expired rooms are skipped at read time.
+    """
+
+    def __init__(self, load_entries: LoadEntries, refresh_seconds: float = 5):
+        self.load_entries = load_entries
+        self.refresh_seconds = refresh_seconds
+        self.loaded = False
+        self._entries: Dict[str, dict] = {}
+        self._by_created: List[Tuple[float, str]] = []
+        self._by_name: List[Tuple[str, str]] = []
+        # Earliest expires_at among the entries; prune() is a no-op before it.
+        self._next_expiry = _NEVER
+        # Local writes made while a reload is in flight, replayed on top of it.
+        self._writes_during_refresh: Optional[List[tuple]] = None
+        # The reload in flight, shared by every caller that asks for one meanwhile.
+        self._refreshing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _created_key(entry: dict) -> Tuple[float, str]:
+        return (-entry["created_at"].timestamp(), entry["room_id"])
+
+    @staticmethod
+    def _name_key(entry: dict) -> Tuple[str, str]:
+        return (entry["name_normalized"], entry["room_id"])
+
+    @staticmethod
+    def _remove_key(index: list, key: tuple) -> None:
+        position = bisect.bisect_left(index, key)
+        if position < len(index) and index[position] == key:
+            del index[position]
+
+    def add(self, entry: dict) -> None:
+        if self._writes_during_refresh is not None:
+            self._writes_during_refresh.append((self.add, entry))
+        self._discard(entry["room_id"])
+        self._entries[entry["room_id"]] = entry
+        bisect.insort(self._by_created, self._created_key(entry))
+        bisect.insort(self._by_name, self._name_key(entry))
+        self._next_expiry = min(self._next_expiry, entry["expires_at"])
+
+    def remove(self, room_id: str) -> None:
+        if self._writes_during_refresh is not None:
+            self._writes_during_refresh.append((self.remove, room_id))
+        self._discard(room_id)
+
+    def _discard(self, room_id: str) -> None:
+        entry = self._entries.pop(room_id, None)
+        if entry is None:
+            return
+        self._remove_key(self._by_created, self._created_key(entry))
+        self._remove_key(self._by_name, self._name_key(entry))
+
+    def replace_all(self, entries: List[dict]) -> None:
+        self._entries = {entry["room_id"]: entry for entry in entries}
+        self._by_created = sorted(self._created_key(entry) for entry in self._entries.values())
+        self._by_name = sorted(self._name_key(entry) for entry in self._entries.values())
+        self._next_expiry = min((entry["expires_at"] for entry in self._entries.values()), default=_NEVER)
+        self.loaded = True
+
+    def prune(self, now: Optional[datetime] = None) -> None:
+        now = now or datetime.now(timezone.utc)
+        if now < self._next_expiry:
+            return
+        for room_id in [room_id for room_id, entry in self._entries.items() if entry["expires_at"] <= now]:
+            self._discard(room_id)
+        self._next_expiry = min((entry["expires_at"] for entry in self._entries.values()), default=_NEVER)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        prefix: Optional[str] = None,
+        now: Optional[datetime] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Returns up to ``limit`` active entries and the cursor for the next page."""
+        now = now or datetime.now(timezone.utc)
+        if prefix:
+            mode, index = "name", self._by_name
+            start_key: tuple = (prefix, "")
+        else:
+            mode, index = "created", self._by_created
+            start_key = (float("-inf"), "")
+        position = bisect.bisect_left(index, start_key)
+        if cursor:
+            position = bisect.bisect_right(index, _decode_cursor(cursor, mode))
+        items = []
+        last_key = None
+        while position < len(index) and len(items) < limit:
+            key = index[position]
+            position += 1
+            if prefix and not key[0].startswith(prefix):
+                return items, None
+            entry = self._entries[key[1]]
+            last_key = key
+            if entry["expires_at"] > now:
+                items.append(entry)
+        has_more = position < len(index) and (not prefix or index[position][0].startswith(prefix))
+        return items, _encode_cursor(mode, last_key) if has_more and last_key else None
+
+    async def refresh(self) -> None:
+        """Reloads the directory; callers arriving during a reload wait for that one."""
+        if self._refreshing is None:
+            # Started here, not in the task, so writes made before it first runs are kept too.
+            self._writes_during_refresh = []
+            self._refreshing = asyncio.create_task(self._reload())
+            self._refreshing.add_done_callback(self._reload_done)
+        # Shielded so a caller that gives up (e.g. a disconnected request) does not cancel the others.
+        await asyncio.shield(self._refreshing)
+
+    def _reload_done(self, task: asyncio.Task) -> None:
+        self._refreshing = None
+        # A reload cancelled before it started never swapped the buffer out.
+        self._writes_during_refresh = None
+        if not task.cancelled():
+            # Retrieved here so a failure nobody waited for is not reported as unhandled.
+            task.exception()
+
+    async def _reload(self) -> None:
+        try:
+            entries = await self.load_entries()
+        finally:
+            writes, self._writes_during_refresh = self._writes_during_refresh, None
+        self.replace_all(entries)
+        for apply, value in writes:
+            apply(value)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refreshing is not None:
+            self._refreshing.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Room directory refresh failed")
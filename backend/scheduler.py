@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[[], Awaitable[None]]
+
+
+class Job:
+    def __init__(
+        self,
+        name: str,
+        func: JobFunc,
+        interval_seconds: float,
+        max_retries: int = 3,
+        retry_base_seconds: float = 5,
+        retry_max_seconds: float = 300,
+    ):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+    def retry_delay(self, failures: int) -> float:
+        # Exponential backoff with jitter, so retries never line up across restarts.
+        ceiling = min(self.retry_max_seconds, self.retry_base_seconds * (2 ** (failures - 1)))
+        return random.uniform(ceiling / 2, ceiling)
+
+
+class JobScheduler:
+    """Runs registered jobs on a single leader elected through a storage lease.
+
+    Every worker runs the same tick loop, but only the worker holding the
+    lease executes jobs. While jobs run, a heartbeat renews the lease every
+    third of its duration; if renewal fails the running job is cancelled,
+    and state is only saved after a successful renewal. Job state (last run, duration, outcome, next run)
+    lives in storage, so a new leader picks up the schedule where the old
+    one stopped, including pending retries.
+    """
+
+    def __init__(
+        self,
+        storage,
+        lease_name: str = "scheduler",
+        lease_seconds: float = 60,
+        tick_seconds: float = 5,
+    ):
+        self.storage = storage
+        self.lease_name = lease_name
+        self.lease_seconds = lease_seconds
+        self.tick_seconds = tick_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, Job] = {}
+        self.is_leader = False
+        # time.monotonic() after which the last renewal no longer holds
+        self._lease_valid_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def job(self, name: str, interval_seconds: float, **options) -> Callable[[JobFunc], JobFunc]:
+        def register(func: JobFunc) -> JobFunc:
+            if name in self.jobs:
+                raise ValueError(f"Job already registered: {name}")
+            self.jobs[name] = Job(name, func, interval_seconds, **options)
+            return func
+        return register
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                await self.storage.release_lease(self.lease_name, self.owner)
+            except Exception:
+                logger.exception("Failed to release scheduler lease")
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if await self._renew_lease():
+                    await self._run_with_heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Scheduler tick failed")
+            await asyncio.sleep(self.tick_seconds)
+
+    async def _acquire_lease(self) -> bool:
+        now = datetime.now(timezone.utc)
+        return await self.storage.acquire_lease(
+            self.lease_name,
+            self.owner,
+            now,
+            now + timedelta(seconds=self.lease_seconds),
+        )
+
+    async def _renew_lease(self) -> bool:
+        """Acquires or renews the lease and updates ``is_leader``."""
+        requested_at = time.monotonic()
+        was_leader = self.is_leader
+        self.is_leader = await self._acquire_lease()
+        if self.is_leader:
+            self._lease_valid_until = requested_at + self.lease_seconds
+        if self.is_leader and not was_leader:
+            logger.info("Scheduler leadership acquired by %s", self.owner)
+        elif was_leader and not self.is_leader:
+            logger.info("Scheduler leadership lost by %s", self.owner)
+        return self.is_leader
+
+    async def _run_with_heartbeat(self) -> None:
+        jobs = asyncio.create_task(self._run_due_jobs())
+        heartbeat = asyncio.create_task(self._heartbeat(jobs))
+        try:
+            await asyncio.wait({jobs})
+        finally:
+            heartbeat.cancel()
+            jobs.cancel()
+        if not jobs.cancelled() and jobs.exception() is not None:
+            raise jobs.exception()
+
+    async def _heartbeat(self, jobs: asyncio.Task) -> None:
+        interval = self.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await self._renew_lease()
+            except Exception:
+                logger.exception("Scheduler lease renewal failed")
+                # Keep going only while the last renewal still covers the next interval.
+                renewed = time.monotonic() + interval < self._lease_valid_until
+                if not renewed:
+                    self.is_leader = False
+            if not renewed:
+                logger.warning("Scheduler lease lost by %s; cancelling running jobs", self.owner)
+                jobs.cancel()
+                return
+
+    async def _run_due_jobs(self) -> None:
+        states = await self.storage.job_states(self.jobs)
+        for job in self.jobs.values():
+            if not self.is_leader:
+                return
+            state = states.get(job.name, {})
+            next_run_at = state.get("next_run_at")
+            if next_run_at is not None:
+                if next_run_at.tzinfo is None:
+                    next_run_at = next_run_at.replace(tzinfo=timezone.utc)
+                if next_run_at > datetime.now(timezone.utc):
+                    continue
+            await self.run_job(job, state.get("consecutive_failures", 0))
+
+    async def run_job(self, job: Job, previous_failures: int = 0) -> None:
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        error = None
+        try:
+            await job.func()
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            logger.exception("Job %s failed", job.name)
+        duration_ms = round((time.perf_counter() - started) * 1000, 3)
+        if not await self._renew_lease():
+            # Another worker may be running this job now; its state wins.
+            logger.warning("Not saving state of job %s: scheduler lease lost", job.name)
+            return
+
+        if error is None:
+            failures = 0
+            next_run_at = started_at + timedelta(seconds=job.interval_seconds)
+        elif previous_failures + 1 <= job.max_retries:
+            failures = previous_failures + 1
+            next_run_at = datetime.now(timezone.utc) + timedelta(seconds=job.retry_delay(failures))
+        else:
+            # Retries exhausted: give up until the next regular interval.
+            failures = 0
+            next_run_at = started_at + timedelta(seconds=job.interval_seconds)
+
+        await self.storage.save_job_state(
+            job.name,
+            {
+                "last_run_at": started_at,
+                "last_duration_ms": duration_ms,
+                "last_outcome": "success" if error is None else "error",
+                "last_error": error,
+                "last_owner": self.owner,
+                "consecutive_failures": failures,
+                "next_run_at": next_run_at,
+            },
+        )
+
+    async def status(self) -> List[dict]:
+        states = await self.storage.job_states(self.jobs)
+        lease = await self.storage.get_lease(self.lease_name)
+        result = []
+        for job in self.jobs.values():
+            state = states.get(job.name, {})
+            result.append(
+                {
+                    "name": job.name,
+                    "interval_seconds": job.interval_seconds,
+                    "leader": lease.get("owner") if lease else None,
+                    "last_run_at": state.get("last_run_at"),
+                    "last_duration_ms": state.get("last_duration_ms"),
+                    "last_outcome": state.get("last_outcome"),
+                    "last_error": state.get("last_error"),
+                    "consecutive_failures": state.get("consecutive_failures", 0),
+                    "next_run_at": state.get("next_run_at"),
+                }
+            )
+        return result
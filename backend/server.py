@@ -1,31 +1,209 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Header, Depends
+# Taken before the heavy imports so startup_seconds covers them too
+import time
+STARTUP_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Depends, Query, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import Any, List, Optional
 import json
 from datetime import datetime, timedelta, timezone
 import hashlib
 import secrets
 import uuid
 import asyncio
+import threading
 import jwt
 from jwt import PyJWTError
-import re
 from passlib.context import CryptContext
+from scheduler import JobScheduler
+from storage import MongoClusters, create_storage
+from tenancy import TenantMiddleware, current_tenant, load_tenants
+from loop_monitor import LoopMonitor, LoopMonitorMiddleware
+from group_commit import RoomWriteBatcher, WriteCommittedError
+from room_directory import InvalidCursor, RoomDirectory
+from traffic_capture import TrafficCaptureMiddleware, TrafficRecorder
+from profiler import ProfilerBusy, SamplingProfiler
+from images import IMAGE_URL_PREFIX, ImmutableStaticFiles, StationImagePipeline
+from password_hashing import (
+    PasswordHashExecutor,
+    PasswordHashQueueFull,
+    hash_room_password,
+    verify_room_password,
+)
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Fast startup: serve as soon as the content cache is warm and let the
+# scheduler leader synchronize the seed data in the background.
+FAST_STARTUP = os.environ.get("FAST_STARTUP", "false").lower() in ("1", "true", "yes")
+CONTENT_CACHE_TTL_SECONDS = float(os.environ.get("CONTENT_CACHE_TTL_SECONDS", "300"))
+
+# Tenants (parishes): a single default tenant unless TENANTS_FILE lists more
+tenants = load_tenants(
+    os.environ.get("TENANTS_FILE"),
+    default_name=os.environ.get("DEFAULT_TENANT", "default"),
+    defaults={
+        "max_active_rooms": int(os.environ.get("TENANT_MAX_ACTIVE_ROOMS", "0")),
+        "max_concurrent_requests": int(os.environ.get("TENANT_MAX_CONCURRENT_REQUESTS", "0")),
+    },
+)
+
+# Storage: MongoDB by default, or the embedded engine for single-process installs
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "mongo").lower()
+# "database": one database per tenant; "collection": shared database, prefixed collections
+TENANT_ISOLATION = os.environ.get("TENANT_ISOLATION", "database").lower()
+mongo_clusters = None
+if STORAGE_BACKEND == "mongo":
+    cluster_urls = os.environ.get("MONGO_CLUSTERS") or os.environ['MONGO_URL']
+    mongo_clusters = MongoClusters(
+        [url.strip() for url in cluster_urls.split(",") if url.strip()],
+        max_pool_size=int(os.environ.get("MONGO_MAX_POOL_SIZE", "100")),
+    )
+
+
+def create_tenant_storage(tenant):
+    is_default = tenant is tenants.default
+    if STORAGE_BACKEND == "mongo":
+        # The default tenant keeps DB_NAME on the first cluster, where existing data lives.
+        url = mongo_clusters.url_for(tenant.name, tenant.cluster or (mongo_clusters.urls[0] if is_default else None))
+        db_name = os.environ['DB_NAME']
+        collection_prefix = None
+        if not is_default and TENANT_ISOLATION == "collection":
+            collection_prefix = f"{tenant.name.replace('-', '_')}_"
+        elif not is_default:
+            db_name = os.environ.get("TENANT_DB_PREFIX", f"{db_name}_") + tenant.name.replace("-", "_")
+        return url, create_storage(
+            "mongo",
+            client=mongo_clusters.client(url),
+            db_name=db_name,
+            collection_prefix=collection_prefix,
+        )
+    snapshot_path = os.environ.get("STORAGE_SNAPSHOT_PATH")
+    if snapshot_path and not is_default:
+        snapshot_path = Path(snapshot_path)
+        snapshot_path = snapshot_path.with_name(f"{snapshot_path.stem}.{tenant.name}{snapshot_path.suffix}")
+    return None, create_storage(
+        STORAGE_BACKEND,
+        snapshot_path=snapshot_path,
+        snapshot_seconds=float(os.environ.get("STORAGE_SNAPSHOT_SECONDS", "30")),
+    )
+
+
+class TenantState:
+    """Everything a tenant does not share: storage, content cache, room directory and write batching."""
+
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self.cluster, self.storage = create_tenant_storage(tenant)
+        # Content cache: intro, stations and final prayers only change on seed sync
+        self.content_cache = {"intro": None, "stations": {}, "final_prayers": [], "loaded_at": None}
+        self.content_cache_refresh: Optional[asyncio.Task] = None
+        # Public room list served from memory; reloaded periodically for other workers' writes
+        self.room_directory = RoomDirectory(
+            self.load_directory_entries,
+            refresh_seconds=float(os.environ.get("ROOM_DIRECTORY_REFRESH_SECONDS", "5")),
+        )
+        # Joins and leaves hitting the same room within a few ms share one write
+        self.room_writes = RoomWriteBatcher(
+            self.storage.push_participants,
+            self.storage.pull_participants,
+            self.find_active_room,
+            window=float(os.environ.get("JOIN_BATCH_WINDOW_MS", "5")) / 1000,
+        )
+
+    async def load_directory_entries(self) -> List[dict]:
+        rooms = await self.storage.active_room_entries(datetime.now(timezone.utc))
+        return [directory_entry(room) for room in rooms]
+
+    async def find_active_room(self, room_id: str) -> Optional[dict]:
+        return await self.storage.find_room(room_id, active_only=True)
+
+    def stats(self) -> dict:
+        return {
+            **self.tenant.stats(),
+            "cluster": mongo_clusters.label(self.cluster) if self.cluster else None,
+            "storage": self.storage.stats(),
+            "listed_rooms": len(self.room_directory),
+            "room_writes": self.room_writes.stats(),
+        }
+
+
+tenant_states = {tenant.name: TenantState(tenant) for tenant in tenants}
+
+
+def tenant_state() -> TenantState:
+    # Outside a request (startup, scheduler) the default tenant applies unless set explicitly.
+    return tenant_states[current_tenant.get(tenants.default).name]
+
+
+async def for_each_tenant(func) -> None:
+    """Runs ``func`` once per tenant with that tenant as the current one."""
+    errors = []
+    for tenant in tenants:
+        token = current_tenant.set(tenant)
+        try:
+            await func()
+        except Exception as exc:
+            logger.exception(f"{func.__name__} failed for tenant {tenant.name}")
+            errors.append(f"{tenant.name}: {exc}")
+        finally:
+            current_tenant.reset(token)
+    if errors:
+        raise RuntimeError("; ".join(errors))
+
+# Dedicated pool for password hashing (rooms and admin)
+password_hasher = PasswordHashExecutor(
+    max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "4")),
+    max_pending=int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "256")),
+)
+
+# Event-loop lag and slow-handler detection
+loop_monitor = LoopMonitor(
+    interval=float(os.environ.get("LOOP_LAG_INTERVAL_MS", "100")) / 1000,
+    stall_threshold=float(os.environ.get("LOOP_STALL_THRESHOLD_MS", "250")) / 1000,
+    slow_request_threshold=float(os.environ.get("SLOW_REQUEST_THRESHOLD_MS", "1000")) / 1000,
+)
+loop_monitor.register_executor("password_hashing", password_hasher.stats)
+
+# On-demand sampling profiler for the current worker
+profiler = SamplingProfiler()
+PROFILER_MAX_SECONDS = float(os.environ.get("PROFILER_MAX_SECONDS", "60"))
+
+# Opt-in capture of sanitized request streams for replay (see replay_traffic.py)
+traffic_recorder = None
+if os.environ.get("TRAFFIC_CAPTURE_DIR"):
+    traffic_recorder = TrafficRecorder(
+        Path(os.environ["TRAFFIC_CAPTURE_DIR"]),
+        max_bytes=int(os.environ.get("TRAFFIC_CAPTURE_MAX_MB", "50")) * 1024 * 1024,
+        max_files=int(os.environ.get("TRAFFIC_CAPTURE_MAX_FILES", "20")),
+        sample_rate=float(os.environ.get("TRAFFIC_CAPTURE_SAMPLE", "1")),
+        key=os.environ.get("TRAFFIC_CAPTURE_KEY"),
+    )
+
+# Responsive variants of the station artwork
+station_images = StationImagePipeline(
+    source_dir=Path(os.environ.get("STATION_IMAGES_DIR", ROOT_DIR.parent / "frontend" / "public" / "images")),
+    output_dir=Path(os.environ.get("IMAGE_CACHE_DIR", ROOT_DIR / "image_cache")),
+    widths=[int(width) for width in os.environ.get("IMAGE_WIDTHS", "320,640,960,1280").split(",")],
+    formats=os.environ.get("IMAGE_FORMATS", "webp,jpeg").split(","),
+)
+station_images.output_dir.mkdir(parents=True, exist_ok=True)
+
+# Background jobs run on a single leader worker; leases and job state live
+# with the default tenant and every job visits all tenants.
+scheduler = JobScheduler(
+    tenant_states[tenants.default.name].storage,
+    lease_seconds=float(os.environ.get("SCHEDULER_LEASE_SECONDS", "60")),
+    tick_seconds=float(os.environ.get("SCHEDULER_TICK_SECONDS", "5")),
+)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -35,6 +213,13 @@ api_router = APIRouter(prefix="/api")
 
 
 # Define Models for Via Sacra
+class ImageVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+    format: str
+    type: str
+
 class Station(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -46,6 +231,10 @@ class Station(BaseModel):
     prayer: str
     standard_prayers: str
     hymn: str
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    image_placeholder: Optional[str] = None
+    image_variants: List[ImageVariant] = Field(default_factory=list)
 
 class IntroText(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -105,6 +294,7 @@ class RoomListItem(BaseModel):
     room_id: str
     name: str
     expires_at: datetime
+    starts_at: Optional[datetime] = None
 
 
 class AdminRoomListItem(BaseModel):
@@ -116,6 +306,38 @@ class AdminRoomListItem(BaseModel):
     current_station: int
     created_at: datetime
     expires_at: datetime
+    starts_at: Optional[datetime] = None
+
+
+class BulkRoomItem(BaseModel):
+    name: str = Field(..., min_length=1)
+    password: str = Field(..., min_length=4)
+    first_name: str = Field(..., min_length=1)
+    last_name: str = Field(..., min_length=1)
+    starts_at: datetime
+    expires_at: Optional[datetime] = None
+
+
+class BulkRoomCreateRequest(BaseModel):
+    # Items are validated one by one so a bad entry does not reject the batch.
+    rooms: List[Any] = Field(..., min_length=1, max_length=200)
+
+
+class BulkRoomResult(BaseModel):
+    index: int
+    name: Optional[str] = None
+    created: bool
+    room_id: Optional[str] = None
+    host_token: Optional[str] = None
+    starts_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class BulkRoomCreateResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkRoomResult]
 
 
 class AdminLoginRequest(BaseModel):
@@ -129,8 +351,9 @@ class AdminLoginResponse(BaseModel):
 
 
 # Initialize database with Via Sacra data
-def load_seed_data() -> dict:
-    seed_file = ROOT_DIR / "via_sacra_data.json"
+def load_seed_data(seed_file_name: Optional[str] = None) -> dict:
+    # Tenants may ship their own content variant next to the default seed file.
+    seed_file = ROOT_DIR / (seed_file_name or "via_sacra_data.json")
     with open(seed_file, "r", encoding="utf-8") as seed:
         return json.load(seed)
 
@@ -138,55 +361,86 @@ def load_seed_data() -> dict:
 async def sync_seed_data(seed_data: dict) -> None:
     if not seed_data:
         return
-    intro_data = seed_data.get("intro")
-    if intro_data:
-        await db.intro.delete_many({})
-        await db.intro.insert_one(intro_data)
-
-    stations_data = seed_data.get("stations", [])
-    for station in stations_data:
-        station_id = station.get("id")
-        if station_id is None:
-            continue
-        await db.stations.update_one({"id": station_id}, {"$set": station}, upsert=True)
+    await tenant_state().storage.sync_content(
+        seed_data.get("intro"),
+        seed_data.get("stations", []),
+        seed_data.get("final_prayers", []),
+    )
+
+
+def seed_digest(seed_data: dict) -> str:
+    return hashlib.sha256(json.dumps(seed_data, sort_keys=True).encode("utf-8")).hexdigest()
 
-    final_prayers_data = seed_data.get("final_prayers", [])
-    if final_prayers_data:
-        await db.final_prayers.delete_many({})
-        await db.final_prayers.insert_many(final_prayers_data)
+
+async def record_seed_digest(digest: str) -> None:
+    await tenant_state().storage.set_seed_digest(digest, datetime.now(timezone.utc))
 
 
 async def init_db():
     try:
-        seed_data = load_seed_data()
+        state = tenant_state()
+        seed_data = load_seed_data(state.tenant.seed_file)
+        digest = seed_digest(seed_data)
         # Check if data already exists
-        count = await db.stations.count_documents({})
+        count = await state.storage.count_stations()
+        await sync_seed_data(seed_data)
+        await record_seed_digest(digest)
         if count > 0:
-            await sync_seed_data(seed_data)
-            logger.info("Database already initialized; seed data synchronized")
-            return
-
-        # Insert intro
-        intro_data = seed_data["intro"]
-        await db.intro.delete_many({})
-        await db.intro.insert_one(intro_data)
-
-        # Insert stations
-        stations_data = seed_data["stations"]
-        await db.stations.delete_many({})
-        await db.stations.insert_many(stations_data)
-
-        # Insert final prayers
-        final_prayers_data = seed_data["final_prayers"]
-        await db.final_prayers.delete_many({})
-        await db.final_prayers.insert_many(final_prayers_data)
-
-        logger.info("Database initialized with Via Sacra data")
+            logger.info(f"Database already initialized for tenant {state.tenant.name}; seed data synchronized")
+        else:
+            logger.info(f"Database initialized with Via Sacra data for tenant {state.tenant.name}")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+async def warm_content_cache() -> None:
+    state = tenant_state()
+    content_cache = state.content_cache
+    intro, stations, final_prayers = await state.storage.load_content()
+    if not stations:
+        # Fresh database still waiting for the seed sync: serve the seed file.
+        seed_data = await asyncio.to_thread(load_seed_data, state.tenant.seed_file)
+        intro = seed_data.get("intro")
+        stations = sorted(seed_data.get("stations", []), key=lambda station: station["id"])
+        final_prayers = seed_data.get("final_prayers", [])
+    content_cache["intro"] = intro
+    content_cache["stations"] = {station["id"]: station_images.attach_variants(station) for station in stations}
+    content_cache["final_prayers"] = final_prayers
+    content_cache["loaded_at"] = time.monotonic()
+
+
+async def get_content() -> dict:
+    state = tenant_state()
+    loaded_at = state.content_cache["loaded_at"]
+    if loaded_at is None:
+        await warm_content_cache()
+    elif time.monotonic() - loaded_at > CONTENT_CACHE_TTL_SECONDS:
+        # Serve the stale copy while a single background refresh runs.
+        if state.content_cache_refresh is None or state.content_cache_refresh.done():
+            state.content_cache_refresh = asyncio.create_task(warm_content_cache())
+    return state.content_cache
+
+
+async def run_password_task(func, *args):
+    try:
+        return await password_hasher.run(func, *args)
+    except PasswordHashQueueFull as exc:
+        raise HTTPException(
+            status_code=503,
+            detail="Servidor ocupado. Tente novamente em instantes.",
+        ) from exc
+
+async def hash_password(password: str) -> str:
+    return await run_password_task(hash_room_password, password)
+
+async def check_room_password(room: dict, password: str) -> bool:
+    valid, new_hash = await run_password_task(verify_room_password, password, room["password_hash"])
+    if valid and new_hash:
+        await tenant_state().storage.update_room(
+            room["room_id"],
+            {"password_hash": new_hash},
+            only_if={"password_hash": room["password_hash"]},
+        )
+    return valid
 
 def normalize_room_name(name: str) -> str:
     return " ".join(name.split()).strip().lower()
@@ -196,15 +450,73 @@ def format_participant_name(first_name: str, last_name: str) -> str:
 
 async def expire_rooms_if_needed():
     now = datetime.now(timezone.utc)
-    await db.rooms.update_many(
-        {"active": True, "expires_at": {"$lte": now}},
-        {"$set": {"active": False}},
-    )
+    state = tenant_state()
+    await state.storage.expire_rooms(now)
+    state.room_directory.prune(now)
+
+def directory_entry(room: dict) -> dict:
+    return {
+        "room_id": room["room_id"],
+        "name": room["name"],
+        "name_normalized": room.get("name_normalized") or normalize_room_name(room["name"]),
+        "created_at": ensure_utc(room["created_at"]),
+        "starts_at": ensure_utc(room["starts_at"]) if room.get("starts_at") else None,
+        "expires_at": ensure_utc(room["expires_at"]),
+    }
 
-async def expire_rooms_loop():
+async def resync_seed_data():
+    state = tenant_state()
+    seed_data = await asyncio.to_thread(load_seed_data, state.tenant.seed_file)
+    digest = seed_digest(seed_data)
+    if await state.storage.get_seed_digest() == digest:
+        return
+    await sync_seed_data(seed_data)
+    await record_seed_digest(digest)
+    await warm_content_cache()
+    logger.info(f"Seed data synchronized by scheduler for tenant {state.tenant.name}")
+
+async def archive_rooms():
+    storage = tenant_state().storage
+    cutoff = datetime.now(timezone.utc) - timedelta(days=int(os.environ.get("ROOM_ARCHIVE_AFTER_DAYS", "30")))
     while True:
-        await expire_rooms_if_needed()
-        await asyncio.sleep(60 * 10)
+        archived = await storage.archive_rooms(cutoff, limit=500)
+        if not archived:
+            return
+        logger.info(f"Archived {archived} rooms")
+
+async def rollup_room_stats():
+    storage = tenant_state().storage
+    now = datetime.now(timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    for day_start in (today - timedelta(days=1), today):
+        day_end = day_start + timedelta(days=1)
+        totals = await storage.room_totals(day_start, day_end)
+        await storage.save_room_stats(day_start.date().isoformat(), {**totals, "updated_at": now})
+    active_rooms = await storage.count_active_rooms(now)
+    await storage.record_peak_active_rooms(today.date().isoformat(), active_rooms)
+
+@scheduler.job("expire_rooms", interval_seconds=60 * 10)
+async def expire_rooms_job():
+    await for_each_tenant(expire_rooms_if_needed)
+
+@scheduler.job("sync_seed_data", interval_seconds=60 * 5)
+async def sync_seed_data_job():
+    await for_each_tenant(resync_seed_data)
+
+@scheduler.job("archive_rooms", interval_seconds=60 * 60 * 6)
+async def archive_rooms_job():
+    await for_each_tenant(archive_rooms)
+
+@scheduler.job("rollup_room_stats", interval_seconds=60 * 60)
+async def rollup_room_stats_job():
+    await for_each_tenant(rollup_room_stats)
+
+async def active_room_quota(state: TenantState) -> Optional[int]:
+    """Rooms the tenant may still open, or None when it has no quota."""
+    if not state.tenant.max_active_rooms:
+        return None
+    active_rooms = await state.storage.count_active_rooms(datetime.now(timezone.utc))
+    return max(0, state.tenant.max_active_rooms - active_rooms)
 
 def room_to_info(room) -> RoomInfo:
     expires_at = ensure_utc(room["expires_at"])
@@ -291,70 +603,138 @@ async def root():
 
 @api_router.get("/intro", response_model=IntroText)
 async def get_intro():
-    intro = await db.intro.find_one({}, {"_id": 0})
+    intro = (await get_content())["intro"]
     if not intro:
         raise HTTPException(status_code=404, detail="Intro not found")
     return intro
 
 @api_router.get("/stations", response_model=List[Station])
 async def get_all_stations():
-    stations = await db.stations.find({}, {"_id": 0}).sort("id", 1).to_list(14)
-    return stations
+    return list((await get_content())["stations"].values())
 
 @api_router.get("/stations/{station_id}", response_model=Station)
 async def get_station(station_id: int):
     if station_id < 1 or station_id > 14:
         raise HTTPException(status_code=400, detail="Station ID must be between 1 and 14")
     
-    station = await db.stations.find_one({"id": station_id}, {"_id": 0})
+    station = (await get_content())["stations"].get(station_id)
     if not station:
         raise HTTPException(status_code=404, detail="Station not found")
     return station
 
 @api_router.get("/final-prayers", response_model=List[FinalPrayer])
 async def get_final_prayers():
-    prayers = await db.final_prayers.find({}, {"_id": 0}).to_list(10)
-    return prayers
+    return (await get_content())["final_prayers"]
 
 @api_router.post("/admin/login", response_model=AdminLoginResponse)
 async def admin_login(payload: AdminLoginRequest):
     allowed_email = _admin_allowed_email()
     if payload.email.lower() != allowed_email.lower():
         raise HTTPException(status_code=401, detail="Credenciais inválidas.")
-    await asyncio.to_thread(verify_admin_password, payload.password)
+    await run_password_task(verify_admin_password, payload.password)
     token = create_admin_token(payload.email)
     return AdminLoginResponse(email=payload.email, token=token)
 
+@api_router.get("/health")
+async def health():
+    summary = loop_monitor.summary()
+    summary["status"] = "ok" if loop_monitor.is_healthy() else "degraded"
+    return summary
+
+@api_router.get("/health/ready")
+async def health_ready():
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready", "startup_seconds": app.state.startup_seconds}
+
+@api_router.get("/admin/metrics")
+async def admin_metrics(_: str = Depends(require_admin)):
+    return {
+        "startup": {
+            "fast_startup": FAST_STARTUP,
+            "ready": getattr(app.state, "ready", False),
+            "startup_seconds": getattr(app.state, "startup_seconds", None),
+        },
+        "password_hashing": password_hasher.stats(),
+        "tenant": tenant_state().tenant.name,
+        "tenants": {name: state.stats() for name, state in tenant_states.items()},
+        "traffic_capture": traffic_recorder.stats() if traffic_recorder else None,
+        "event_loop": {
+            **loop_monitor.summary(),
+            "in_flight_requests": loop_monitor.in_flight(),
+            "recent_stalls": list(loop_monitor.recent_stalls),
+            "recent_slow_requests": list(loop_monitor.recent_slow_requests),
+        },
+    }
+
+@api_router.post("/admin/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    _: str = Depends(require_admin),
+):
+    if seconds > PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Duração máxima: {PROFILER_MAX_SECONDS:g} segundos.")
+    try:
+        result = await profiler.profile(threading.get_ident(), seconds, interval_ms / 1000)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="Já existe um perfil em execução neste worker.")
+    return PlainTextResponse(
+        result["collapsed"] + "\n",
+        headers={
+            "X-Profile-Samples": str(result["samples"]),
+            "X-Profile-Seconds": str(result["elapsed_seconds"]),
+            "X-Profile-Overhead": str(result["overhead"]),
+            "X-Profile-Pid": str(os.getpid()),
+        },
+    )
+
+@api_router.get("/admin/jobs")
+async def list_admin_jobs(_: str = Depends(require_admin)):
+    return await scheduler.status()
+
 @api_router.get("/rooms", response_model=List[RoomListItem])
-async def list_rooms():
-    await expire_rooms_if_needed()
-    rooms = await db.rooms.find(
-        {"active": True, "expires_at": {"$gt": datetime.now(timezone.utc)}},
-        {"_id": 0, "password_hash": 0, "host_token": 0},
-    ).sort("created_at", -1).to_list(100)
-    for room in rooms:
-        room["expires_at"] = ensure_utc(room["expires_at"])
-    return [RoomListItem(**room) for room in rooms]
+async def list_rooms(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+):
+    state = tenant_state()
+    if not state.room_directory.loaded:
+        await state.room_directory.refresh()
+    try:
+        rooms, next_cursor = state.room_directory.page(
+            limit=limit,
+            cursor=cursor,
+            prefix=normalize_room_name(q) if q else None,
+        )
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        RoomListItem(
+            room_id=room["room_id"],
+            name=room["name"],
+            expires_at=room["expires_at"],
+            starts_at=room["starts_at"],
+        )
+        for room in rooms
+    ]
 
 @api_router.post("/rooms", response_model=RoomCreatedResponse)
 async def create_room(room: RoomCreateRequest):
+    state = tenant_state()
     now = datetime.now(timezone.utc)
     await expire_rooms_if_needed()
     name = room.name.strip()
     normalized_name = normalize_room_name(name)
     host_name = format_participant_name(room.first_name, room.last_name)
-    existing_room = await db.rooms.find_one(
-        {
-            "active": True,
-            "$or": [
-                {"name_normalized": normalized_name},
-                {"name": {"$regex": f"^{re.escape(name)}$", "$options": "i"}},
-            ],
-        },
-        {"_id": 1},
-    )
-    if existing_room:
+    if await state.storage.taken_room_names([(name, normalized_name)]):
         raise HTTPException(status_code=409, detail="Esse nome de sala já existe.")
+    if await active_room_quota(state) == 0:
+        raise HTTPException(status_code=429, detail="Limite de salas ativas desta paróquia atingido.")
     room_id = str(uuid.uuid4())
     expires_at = now + timedelta(hours=24)
     host_token = str(uuid.uuid4())
@@ -364,8 +744,9 @@ async def create_room(room: RoomCreateRequest):
         "name": name,
         "name_normalized": normalized_name,
         "password_plain": room.password,
-        "password_hash": hash_password(room.password),
+        "password_hash": await hash_password(room.password),
         "created_at": now,
+        "starts_at": now,
         "expires_at": expires_at,
         "active": True,
         "current_station": 1,
@@ -373,7 +754,8 @@ async def create_room(room: RoomCreateRequest):
         "host_token": host_token,
         "participants": [{"name": host_name, "joined_at": now, "is_host": True}],
     }
-    await db.rooms.insert_one(new_room)
+    await state.storage.insert_room(new_room)
+    state.room_directory.add(directory_entry(new_room))
     return RoomCreatedResponse(
         room_id=room_id,
         name=new_room["name"],
@@ -384,56 +766,43 @@ async def create_room(room: RoomCreateRequest):
 
 @api_router.post("/rooms/join", response_model=RoomInfo)
 async def join_room(payload: RoomJoinRequest):
+    state = tenant_state()
     await expire_rooms_if_needed()
-    room = await db.rooms.find_one(
-        {"room_id": payload.room_id, "active": True},
-        {"_id": 0},
-    )
+    room = await state.storage.find_room(payload.room_id, active_only=True)
     if not room:
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
     if ensure_utc(room["expires_at"]) <= datetime.now(timezone.utc):
-        await db.rooms.update_one(
-            {"room_id": payload.room_id},
-            {"$set": {"active": False}},
-        )
+        await state.storage.update_room(payload.room_id, {"active": False})
+        state.room_directory.remove(payload.room_id)
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
-    if hash_password(payload.password) != room["password_hash"]:
+    if not await check_room_password(room, payload.password):
         raise HTTPException(status_code=401, detail="Senha incorreta.")
-    participant_name = format_participant_name(payload.first_name, payload.last_name)
-    await db.rooms.update_one(
-        {"room_id": payload.room_id},
-        {
-            "$inc": {"participant_count": 1},
-            "$push": {
-                "participants": {
-                    "name": participant_name,
-                    "joined_at": datetime.now(timezone.utc),
-                    "is_host": False,
-                }
-            },
-        },
-    )
-    updated_room = await db.rooms.find_one({"room_id": payload.room_id, "active": True}, {"_id": 0})
+    participant = {
+        "name": format_participant_name(payload.first_name, payload.last_name),
+        "joined_at": datetime.now(timezone.utc),
+        "is_host": False,
+    }
+    try:
+        updated_room = await state.room_writes.join(payload.room_id, participant)
+    except WriteCommittedError:
+        # The join is stored; answer from the room read above instead of inviting a retry.
+        updated_room = {**room, "participants": room.get("participants", []) + [participant]}
     if not updated_room:
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
     return room_to_info(updated_room)
 
 @api_router.post("/rooms/{room_id}/host-login", response_model=RoomCreatedResponse)
 async def host_login(room_id: str, payload: RoomHostLoginRequest):
+    state = tenant_state()
     await expire_rooms_if_needed()
-    room = await db.rooms.find_one(
-        {"room_id": room_id, "active": True},
-        {"_id": 0},
-    )
+    room = await state.storage.find_room(room_id, active_only=True)
     if not room:
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
     if ensure_utc(room["expires_at"]) <= datetime.now(timezone.utc):
-        await db.rooms.update_one(
-            {"room_id": room_id},
-            {"$set": {"active": False}},
-        )
+        await state.storage.update_room(room_id, {"active": False})
+        state.room_directory.remove(room_id)
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
-    if hash_password(payload.password) != room["password_hash"]:
+    if not await check_room_password(room, payload.password):
         raise HTTPException(status_code=401, detail="Senha incorreta.")
     host_name = format_participant_name(payload.first_name, payload.last_name)
     host_participant = next(
@@ -443,20 +812,11 @@ async def host_login(room_id: str, payload: RoomHostLoginRequest):
     if not host_participant or host_participant.get("name") != host_name:
         raise HTTPException(status_code=403, detail="Apenas o anfitrião pode acessar.")
     if not any(participant.get("name") == host_name for participant in room.get("participants", [])):
-        await db.rooms.update_one(
-            {"room_id": room_id},
-            {
-                "$inc": {"participant_count": 1},
-                "$push": {
-                    "participants": {
-                        "name": host_name,
-                        "joined_at": datetime.now(timezone.utc),
-                        "is_host": True,
-                    }
-                },
-            },
+        await state.storage.push_participants(
+            room_id,
+            [{"name": host_name, "joined_at": datetime.now(timezone.utc), "is_host": True}],
         )
-        room = await db.rooms.find_one({"room_id": room_id, "active": True}, {"_id": 0}) or room
+        room = await state.storage.find_room(room_id, active_only=True) or room
     return RoomCreatedResponse(
         room_id=room["room_id"],
         name=room["name"],
@@ -476,29 +836,30 @@ async def host_login(room_id: str, payload: RoomHostLoginRequest):
 
 @api_router.post("/rooms/{room_id}/leave", response_model=RoomInfo)
 async def leave_room(room_id: str, payload: RoomLeaveRequest):
+    state = tenant_state()
     await expire_rooms_if_needed()
-    room = await db.rooms.find_one(
-        {"room_id": room_id, "active": True},
-        {"_id": 0},
-    )
+    room = await state.storage.find_room(room_id, active_only=True)
     if not room:
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
-    await db.rooms.update_one(
-        {"room_id": room_id},
-        {
-            "$inc": {"participant_count": -1},
-            "$pull": {"participants": {"name": payload.name}},
-        },
-    )
-    updated_room = await db.rooms.find_one({"room_id": room_id, "active": True}, {"_id": 0})
+    try:
+        updated_room = await state.room_writes.leave(room_id, payload.name)
+    except WriteCommittedError:
+        # The leave is stored; answer from the room read above instead of inviting a retry.
+        updated_room = {
+            **room,
+            "participants": [
+                participant for participant in room.get("participants", []) if participant.get("name") != payload.name
+            ],
+        }
     if not updated_room:
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
     return room_to_info(updated_room)
 
 @api_router.get("/rooms/{room_id}", response_model=RoomInfo)
 async def get_room(room_id: str):
+    state = tenant_state()
     await expire_rooms_if_needed()
-    room = await db.rooms.find_one({"room_id": room_id}, {"_id": 0})
+    room = await state.storage.find_room(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
     if not room.get("active", False):
@@ -506,56 +867,43 @@ async def get_room(room_id: str):
             raise HTTPException(status_code=410, detail="Sala concluída.")
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
     if ensure_utc(room["expires_at"]) <= datetime.now(timezone.utc):
-        await db.rooms.update_one(
-            {"room_id": room_id},
-            {"$set": {"active": False}},
-        )
+        await state.storage.update_room(room_id, {"active": False})
+        state.room_directory.remove(room_id)
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
     return room_to_info(room)
 
 @api_router.patch("/rooms/{room_id}/station", response_model=RoomInfo)
 async def update_room_station(room_id: str, payload: RoomStationUpdate):
+    state = tenant_state()
     await expire_rooms_if_needed()
-    room = await db.rooms.find_one(
-        {"room_id": room_id, "active": True},
-        {"_id": 0},
-    )
+    room = await state.storage.find_room(room_id, active_only=True)
     if not room:
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
     if room["host_token"] != payload.host_token:
         raise HTTPException(status_code=403, detail="Apenas o anfitrião pode avançar.")
-    await db.rooms.update_one(
-        {"room_id": room_id},
-        {"$set": {"current_station": payload.station}},
-    )
+    await state.storage.update_room(room_id, {"current_station": payload.station})
     room["current_station"] = payload.station
     return room_to_info(room)
 
 @api_router.patch("/rooms/{room_id}/complete", response_model=RoomInfo)
 async def complete_room(room_id: str, payload: RoomCompleteRequest):
+    state = tenant_state()
     await expire_rooms_if_needed()
-    room = await db.rooms.find_one(
-        {"room_id": room_id, "active": True},
-        {"_id": 0},
-    )
+    room = await state.storage.find_room(room_id, active_only=True)
     if not room:
         raise HTTPException(status_code=404, detail="Sala não encontrada ou expirada.")
     if room["host_token"] != payload.host_token:
         raise HTTPException(status_code=403, detail="Apenas o anfitrião pode concluir.")
-    await db.rooms.update_one(
-        {"room_id": room_id},
-        {"$set": {"active": False, "completed_at": datetime.now(timezone.utc)}},
-    )
+    await state.storage.update_room(room_id, {"active": False, "completed_at": datetime.now(timezone.utc)})
+    state.room_directory.remove(room_id)
     room["active"] = False
     return room_to_info(room)
 
 @api_router.get("/admin/rooms", response_model=List[AdminRoomListItem])
 async def list_admin_rooms(name: Optional[str] = None, _: str = Depends(require_admin)):
+    state = tenant_state()
     await expire_rooms_if_needed()
-    query = {}
-    if name:
-        query["name"] = {"$regex": name, "$options": "i"}
-    rooms = await db.rooms.find(query, {"_id": 0}).sort("created_at", -1).to_list(200)
+    rooms = await state.storage.search_rooms(name, limit=200)
     result = []
     for room in rooms:
         room["created_at"] = ensure_utc(room["created_at"])
@@ -570,17 +918,124 @@ async def list_admin_rooms(name: Optional[str] = None, _: str = Depends(require_
                 current_station=room.get("current_station", 1),
                 created_at=room["created_at"],
                 expires_at=room["expires_at"],
+                starts_at=ensure_utc(room["starts_at"]) if room.get("starts_at") else None,
             )
         )
     return result
 
+@api_router.post("/admin/rooms/bulk", response_model=BulkRoomCreateResponse)
+async def create_rooms_bulk(payload: BulkRoomCreateRequest, _: str = Depends(require_admin)):
+    state = tenant_state()
+    now = datetime.now(timezone.utc)
+    await expire_rooms_if_needed()
+    results = [BulkRoomResult(index=index, created=False) for index in range(len(payload.rooms))]
+    candidates = []
+    seen_names = set()
+    for index, raw_item in enumerate(payload.rooms):
+        result = results[index]
+        if not isinstance(raw_item, dict):
+            result.error = "O item deve ser um objeto JSON."
+            continue
+        result.name = raw_item.get("name") if isinstance(raw_item.get("name"), str) else None
+        try:
+            item = BulkRoomItem.model_validate(raw_item)
+        except ValidationError as exc:
+            result.error = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+            )
+            continue
+        name = item.name.strip()
+        normalized_name = normalize_room_name(name)
+        starts_at = ensure_utc(item.starts_at)
+        expires_at = ensure_utc(item.expires_at) if item.expires_at else starts_at + timedelta(hours=24)
+        result.name = name
+        if not normalized_name:
+            result.error = "Nome da sala inválido."
+        elif starts_at <= now:
+            result.error = "O início deve ser no futuro."
+        elif expires_at <= starts_at:
+            result.error = "A expiração deve ser posterior ao início."
+        elif normalized_name in seen_names:
+            result.error = "Nome de sala repetido no lote."
+        else:
+            seen_names.add(normalized_name)
+            candidates.append((index, item, name, normalized_name, starts_at, expires_at))
+
+    if candidates:
+        # One uniqueness query for the whole batch.
+        taken = await state.storage.taken_room_names([(candidate[2], candidate[3]) for candidate in candidates])
+        for candidate in candidates:
+            if candidate[3] in taken:
+                results[candidate[0]].error = "Esse nome de sala já existe."
+        candidates = [candidate for candidate in candidates if candidate[3] not in taken]
+        remaining = await active_room_quota(state)
+        if remaining is not None:
+            for candidate in candidates[remaining:]:
+                results[candidate[0]].error = "Limite de salas ativas desta paróquia atingido."
+            candidates = candidates[:remaining]
+
+    # A full hashing queue fails only the items it rejected, not the batch.
+    password_hashes = await asyncio.gather(
+        *(hash_password(candidate[1].password) for candidate in candidates),
+        return_exceptions=True,
+    )
+    hashed = []
+    for candidate, password_hash in zip(candidates, password_hashes):
+        if isinstance(password_hash, HTTPException):
+            results[candidate[0]].error = password_hash.detail
+        elif isinstance(password_hash, BaseException):
+            logger.error(f"Error hashing password for bulk room {candidate[2]}: {password_hash!r}")
+            results[candidate[0]].error = "Erro ao criar a sala."
+        else:
+            hashed.append((candidate, password_hash))
+    candidates = [candidate for candidate, _ in hashed]
+    new_rooms = []
+    for candidate, password_hash in hashed:
+        index, item, name, normalized_name, starts_at, expires_at = candidate
+        host_name = format_participant_name(item.first_name, item.last_name)
+        new_rooms.append(
+            {
+                "room_id": str(uuid.uuid4()),
+                "name": name,
+                "name_normalized": normalized_name,
+                "password_plain": item.password,
+                "password_hash": password_hash,
+                "created_at": now,
+                "starts_at": starts_at,
+                "expires_at": expires_at,
+                "active": True,
+                "current_station": 1,
+                "participant_count": 1,
+                "host_token": str(uuid.uuid4()),
+                "participants": [{"name": host_name, "joined_at": now, "is_host": True}],
+            }
+        )
+
+    failed_positions = await state.storage.insert_rooms(new_rooms) if new_rooms else {}
+    for position, (candidate, new_room) in enumerate(zip(candidates, new_rooms)):
+        result = results[candidate[0]]
+        if position in failed_positions:
+            result.error = failed_positions[position]
+            continue
+        state.room_directory.add(directory_entry(new_room))
+        result.created = True
+        result.room_id = new_room["room_id"]
+        result.host_token = new_room["host_token"]
+        result.starts_at = new_room["starts_at"]
+        result.expires_at = new_room["expires_at"]
+
+    # Warm the content the participants will fetch as soon as the rooms open;
+    # the new rooms are already in the room directory.
+    await get_content()
+    created = sum(1 for result in results if result.created)
+    return BulkRoomCreateResponse(created=created, failed=len(results) - created, results=results)
+
 @api_router.patch("/admin/rooms/{room_id}/deactivate", response_model=AdminRoomListItem)
 async def deactivate_room(room_id: str, _: str = Depends(require_admin)):
-    await db.rooms.update_one(
-        {"room_id": room_id},
-        {"$set": {"active": False, "deactivated_at": datetime.now(timezone.utc)}},
-    )
-    room = await db.rooms.find_one({"room_id": room_id}, {"_id": 0})
+    state = tenant_state()
+    await state.storage.update_room(room_id, {"active": False, "deactivated_at": datetime.now(timezone.utc)})
+    state.room_directory.remove(room_id)
+    room = await state.storage.find_room(room_id)
     if not room:
         raise HTTPException(status_code=404, detail="Sala não encontrada.")
     room["created_at"] = ensure_utc(room["created_at"])
@@ -594,18 +1049,39 @@ async def deactivate_room(room_id: str, _: str = Depends(require_admin)):
         current_station=room.get("current_station", 1),
         created_at=room["created_at"],
         expires_at=room["expires_at"],
+        starts_at=ensure_utc(room["starts_at"]) if room.get("starts_at") else None,
     )
 
 
 # Include the router in the main app
 app.include_router(api_router)
+app.mount(
+    IMAGE_URL_PREFIX,
+    ImmutableStaticFiles(directory=station_images.output_dir, check_dir=False),
+    name="images",
+)
+
+app.add_middleware(LoopMonitorMiddleware, monitor=loop_monitor)
 
+if traffic_recorder:
+    app.add_middleware(TrafficCaptureMiddleware, recorder=traffic_recorder)
+
+# Outside the app middleware, so everything below sees the tenant and the path without /t/{tenant}
+app.add_middleware(
+    TenantMiddleware,
+    registry=tenants,
+    queue_timeout=float(os.environ.get("TENANT_QUEUE_TIMEOUT_MS", "1000")) / 1000,
+)
+
+# Added last so it is outermost: preflights are answered before tenant
+# metering, and the tenant 404/503 responses still carry CORS headers.
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Configure logging
@@ -615,14 +1091,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def warm_tenant():
+    await warm_content_cache()
+    await tenant_state().room_directory.refresh()
+
+async def warm_until_ready():
+    delay = 0.5
+    while True:
+        try:
+            await for_each_tenant(warm_tenant)
+            break
+        except Exception as e:
+            logger.error(f"Error warming content cache: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+    app.state.startup_seconds = round(time.perf_counter() - STARTUP_STARTED, 3)
+    app.state.ready = True
+    logger.info(f"Worker ready in {app.state.startup_seconds}s (fast_startup={FAST_STARTUP})")
+
 @app.on_event("startup")
 async def startup_event():
-    await init_db()
-    app.state.expire_rooms_task = asyncio.create_task(expire_rooms_loop())
+    app.state.ready = False
+    profiler.register_routes(app.routes)
+    loop_monitor.start()
+    if traffic_recorder:
+        traffic_recorder.start()
+    for state in tenant_states.values():
+        await state.storage.start()
+    # Variants are built with the image (python images.py build); workers only read the manifest.
+    if not station_images.load():
+        logger.info("No station image manifest in %s; serving original image URLs", station_images.output_dir)
+    if not FAST_STARTUP:
+        await for_each_tenant(init_db)
+    app.state.warm_task = asyncio.create_task(warm_until_ready())
+    for state in tenant_states.values():
+        state.room_directory.start()
+    scheduler.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
-    task = getattr(app.state, "expire_rooms_task", None)
+    task = getattr(app.state, "warm_task", None)
     if task:
         task.cancel()
+    await scheduler.stop()
+    for state in tenant_states.values():
+        await state.room_directory.stop()
+    await loop_monitor.stop()
+    if traffic_recorder:
+        await asyncio.to_thread(traffic_recorder.stop)
+    for state in tenant_states.values():
+        await state.storage.stop()
+    if mongo_clusters:
+        mongo_clusters.close()
+    password_hasher.shutdown()
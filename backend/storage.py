@@ -0,0 +1,590 @@
+import asyncio
+import copy
+import logging
+import os
+import pickle
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from tenancy import HashRing
+
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_FIELDS = ("room_id", "name", "name_normalized", "created_at", "starts_at", "expires_at")
+
+
+def _normalize_name(name: str) -> str:
+    return " ".join(name.split()).strip().lower()
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class MongoClusters:
+    """One Motor client, and so one connection pool, per cluster URL.
+
+    Tenants are placed on clusters by a consistent-hash ring over the
+    configured URLs unless they pin a cluster explicitly.
+    """
+
+    def __init__(self, urls: List[str], max_pool_size: int = 100):
+        self.urls = urls
+        self.ring = HashRing(urls)
+        self.max_pool_size = max_pool_size
+        self._clients: Dict[str, object] = {}
+
+    def url_for(self, tenant_name: str, pinned: Optional[str] = None) -> str:
+        return pinned or self.ring.node_for(tenant_name)
+
+    def client(self, url: str):
+        if url not in self._clients:
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            self._clients[url] = AsyncIOMotorClient(url, maxPoolSize=self.max_pool_size)
+        return self._clients[url]
+
+    def label(self, url: str) -> str:
+        # Cluster URLs may carry credentials; expose their position instead.
+        return f"cluster-{self.urls.index(url)}" if url in self.urls else "pinned"
+
+    def close(self) -> None:
+        for client in self._clients.values():
+            client.close()
+        self._clients.clear()
+
+
+class PrefixedDatabase:
+    """View of a database where every collection name carries ``prefix``."""
+
+    def __init__(self, db, prefix: str):
+        self._db = db
+        self.prefix = prefix
+        self.name = f"{db.name}.{prefix}*"
+
+    def __getattr__(self, collection: str):
+        return self._db[self.prefix + collection]
+
+
+class MongoStorage:
+    """Storage backed by MongoDB through Motor; one collection per kind of document."""
+
+    name = "mongo"
+
+    def __init__(self, db):
+        self.db = db
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "database": self.db.name}
+
+    # Content
+
+    async def load_content(self) -> Tuple[Optional[dict], List[dict], List[dict]]:
+        intro = await self.db.intro.find_one({}, {"_id": 0})
+        stations = await self.db.stations.find({}, {"_id": 0}).sort("id", 1).to_list(14)
+        final_prayers = await self.db.final_prayers.find({}, {"_id": 0}).to_list(10)
+        return intro, stations, final_prayers
+
+    async def count_stations(self) -> int:
+        return await self.db.stations.count_documents({})
+
+    async def sync_content(self, intro: Optional[dict], stations: List[dict], final_prayers: List[dict]) -> None:
+        # insert_one/insert_many add an _id to the documents they are given.
+        if intro:
+            await self.db.intro.delete_many({})
+            await self.db.intro.insert_one(dict(intro))
+        for station in stations:
+            if station.get("id") is None:
+                continue
+            await self.db.stations.update_one({"id": station["id"]}, {"$set": station}, upsert=True)
+        if final_prayers:
+            await self.db.final_prayers.delete_many({})
+            await self.db.final_prayers.insert_many([dict(prayer) for prayer in final_prayers])
+
+    async def get_seed_digest(self) -> Optional[str]:
+        meta = await self.db.seed_meta.find_one({"_id": "via_sacra"})
+        return meta.get("digest") if meta else None
+
+    async def set_seed_digest(self, digest: str, synced_at: datetime) -> None:
+        await self.db.seed_meta.update_one(
+            {"_id": "via_sacra"},
+            {"$set": {"digest": digest, "synced_at": synced_at}},
+            upsert=True,
+        )
+
+    # Rooms
+
+    async def find_room(self, room_id: str, active_only: bool = False) -> Optional[dict]:
+        query = {"room_id": room_id}
+        if active_only:
+            query["active"] = True
+        return await self.db.rooms.find_one(query, {"_id": 0})
+
+    async def taken_room_names(self, names: List[Tuple[str, str]]) -> Set[str]:
+        """Returns the normalized names, out of (name, normalized) pairs, used by active rooms."""
+        # The regex branch covers legacy rooms stored without name_normalized.
+        existing = await self.db.rooms.find(
+            {
+                "active": True,
+                "$or": [
+                    {"name_normalized": {"$in": [normalized for _, normalized in names]}},
+                    {"name": {"$in": [re.compile(f"^{re.escape(name)}$", re.IGNORECASE) for name, _ in names]}},
+                ],
+            },
+            {"_id": 0, "name": 1, "name_normalized": 1},
+        ).to_list(None)
+        return {room.get("name_normalized") or _normalize_name(room["name"]) for room in existing}
+
+    async def insert_room(self, room: dict) -> None:
+        await self.db.rooms.insert_one(dict(room))
+
+    async def insert_rooms(self, rooms: List[dict]) -> Dict[int, str]:
+        """Inserts unordered; returns error messages keyed by position in ``rooms``."""
+        try:
+            await self.db.rooms.insert_many([dict(room) for room in rooms], ordered=False)
+        except BulkWriteError as exc:
+            return {
+                error["index"]: error.get("errmsg", "Erro ao criar a sala.")
+                for error in exc.details.get("writeErrors", [])
+            }
+        return {}
+
+    async def update_room(self, room_id: str, fields: dict, only_if: Optional[dict] = None) -> None:
+        await self.db.rooms.update_one({"room_id": room_id, **(only_if or {})}, {"$set": fields})
+
+    async def expire_rooms(self, now: datetime) -> None:
+        await self.db.rooms.update_many(
+            {"active": True, "expires_at": {"$lte": now}},
+            {"$set": {"active": False}},
+        )
+
+    async def push_participants(self, room_id: str, participants: List[dict]) -> None:
+        await self.db.rooms.update_one(
+            {"room_id": room_id},
+            {
+                "$inc": {"participant_count": len(participants)},
+                "$push": {"participants": {"$each": participants}},
+            },
+        )
+
+    async def pull_participants(self, room_id: str, names: List[str]) -> None:
+        await self.db.rooms.update_one(
+            {"room_id": room_id},
+            {
+                "$inc": {"participant_count": -len(names)},
+                "$pull": {"participants": {"name": {"$in": names}}},
+            },
+        )
+
+    async def active_room_entries(self, now: datetime) -> List[dict]:
+        return await self.db.rooms.find(
+            {"active": True, "expires_at": {"$gt": now}},
+            {"_id": 0, **{field: 1 for field in DIRECTORY_FIELDS}},
+        ).to_list(None)
+
+    async def search_rooms(self, name: Optional[str] = None, limit: int = 200) -> List[dict]:
+        query = {}
+        if name:
+            query["name"] = {"$regex": name, "$options": "i"}
+        return await self.db.rooms.find(query, {"_id": 0}).sort("created_at", -1).to_list(limit)
+
+    async def archive_rooms(self, cutoff: datetime, limit: int = 500) -> int:
+        rooms = await self.db.rooms.find({"active": False, "expires_at": {"$lte": cutoff}}).to_list(limit)
+        if not rooms:
+            return 0
+        # Upsert first so a run interrupted before the delete is safe to repeat.
+        await self.db.rooms_archive.bulk_write(
+            [ReplaceOne({"_id": room["_id"]}, room, upsert=True) for room in rooms],
+            ordered=False,
+        )
+        await self.db.rooms.delete_many({"_id": {"$in": [room["_id"] for room in rooms]}})
+        return len(rooms)
+
+    # Stats
+
+    async def room_totals(self, start: datetime, end: datetime) -> dict:
+        totals = await self.db.rooms.aggregate(
+            [
+                {"$match": {"created_at": {"$gte": start, "$lt": end}}},
+                {
+                    "$group": {
+                        "_id": None,
+                        "rooms_created": {"$sum": 1},
+                        "participants": {"$sum": "$participant_count"},
+                        "rooms_completed": {"$sum": {"$cond": [{"$ifNull": ["$completed_at", False]}, 1, 0]}},
+                    }
+                },
+            ]
+        ).to_list(1)
+        stats = totals[0] if totals else {}
+        return {
+            "rooms_created": stats.get("rooms_created", 0),
+            "participants": stats.get("participants", 0),
+            "rooms_completed": stats.get("rooms_completed", 0),
+        }
+
+    async def count_active_rooms(self, now: datetime) -> int:
+        return await self.db.rooms.count_documents({"active": True, "expires_at": {"$gt": now}})
+
+    async def save_room_stats(self, day: str, stats: dict) -> None:
+        await self.db.room_stats.update_one({"_id": day}, {"$set": stats}, upsert=True)
+
+    async def record_peak_active_rooms(self, day: str, active_rooms: int) -> None:
+        await self.db.room_stats.update_one({"_id": day}, {"$max": {"peak_active_rooms": active_rooms}})
+
+    # Scheduler
+
+    async def acquire_lease(self, name: str, owner: str, now: datetime, expires_at: datetime) -> bool:
+        try:
+            await self.db.scheduler_leases.update_one(
+                {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": owner, "renewed_at": now, "expires_at": expires_at}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # The lease document exists and is held by another live worker.
+            return False
+        return True
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        await self.db.scheduler_leases.delete_one({"_id": name, "owner": owner})
+
+    async def get_lease(self, name: str) -> Optional[dict]:
+        return await self.db.scheduler_leases.find_one({"_id": name})
+
+    async def job_states(self, names: Iterable[str]) -> Dict[str, dict]:
+        return {state["_id"]: state async for state in self.db.scheduler_jobs.find({"_id": {"$in": list(names)}})}
+
+    async def save_job_state(self, name: str, state: dict) -> None:
+        await self.db.scheduler_jobs.update_one({"_id": name}, {"$set": state}, upsert=True)
+
+
+class MemoryStorage:
+    """Embedded storage for single-process installs, tests and benchmarks.
+
+    Everything lives in plain dicts owned by the event loop, so operations
+    complete without I/O. With a ``snapshot_path`` the data is pickled to
+    disk every ``snapshot_seconds`` when it changed (and on stop), written
+    to a temporary file and renamed into place, and loaded back on start.
+    Data is not shared between processes: run a single worker.
+    """
+
+    name = "memory"
+    _PERSISTED = ("intro", "stations", "final_prayers", "seed_digest", "rooms", "rooms_archive", "room_stats")
+
+    def __init__(self, snapshot_path: Optional[Path] = None, snapshot_seconds: float = 30):
+        self.snapshot_path = snapshot_path
+        self.snapshot_seconds = snapshot_seconds
+        self.intro: Optional[dict] = None
+        self.stations: Dict[int, dict] = {}
+        self.final_prayers: List[dict] = []
+        self.seed_digest: Optional[str] = None
+        self.rooms: Dict[str, dict] = {}
+        self.rooms_archive: Dict[str, dict] = {}
+        self.room_stats: Dict[str, dict] = {}
+        self.leases: Dict[str, dict] = {}
+        self.jobs: Dict[str, dict] = {}
+        # normalized name -> room_ids, so uniqueness checks skip the full scan
+        self._names: Dict[str, Set[str]] = {}
+        # Earliest expires_at among active rooms; expire_rooms() is a no-op before it.
+        self._next_expiry = datetime.min.replace(tzinfo=timezone.utc)
+        self._dirty = False
+        self._snapshots = 0
+        self._last_snapshot_ms: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.snapshot_path and self.snapshot_path.exists():
+            data = await asyncio.to_thread(lambda: pickle.loads(self.snapshot_path.read_bytes()))
+            for field in self._PERSISTED:
+                if field in data:
+                    setattr(self, field, data[field])
+            self._names = {}
+            for room in self.rooms.values():
+                self._names.setdefault(room["name_normalized"], set()).add(room["room_id"])
+            logger.info("Loaded storage snapshot with %s rooms from %s", len(self.rooms), self.snapshot_path)
+        if self.snapshot_path and self._task is None:
+            self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.snapshot()
+
+    async def snapshot(self) -> None:
+        if not self.snapshot_path or not self._dirty:
+            return
+        started = asyncio.get_running_loop().time()
+        # Copied on the loop so the snapshot is consistent; pickling and disk I/O happen off it.
+        state = self._snapshot_state()
+        self._dirty = False
+        await asyncio.to_thread(self._write_snapshot, state)
+        self._snapshots += 1
+        self._last_snapshot_ms = round((asyncio.get_running_loop().time() - started) * 1000, 3)
+
+    def _snapshot_state(self) -> dict:
+        # Only rooms and room stats are edited in place; the other fields are replaced, never mutated.
+        return {
+            "intro": self.intro,
+            "stations": dict(self.stations),
+            "final_prayers": self.final_prayers,
+            "seed_digest": self.seed_digest,
+            "rooms": {room_id: self._copy_room(room) for room_id, room in self.rooms.items()},
+            "rooms_archive": dict(self.rooms_archive),
+            "room_stats": {day: dict(stats) for day, stats in self.room_stats.items()},
+        }
+
+    def _write_snapshot(self, state: dict) -> None:
+        payload = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.snapshot_path.with_name(self.snapshot_path.name + ".tmp")
+        with open(temporary, "wb") as snapshot:
+            snapshot.write(payload)
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        os.replace(temporary, self.snapshot_path)
+
+    async def _snapshot_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_seconds)
+            try:
+                await self.snapshot()
+            except Exception:
+                self._dirty = True
+                logger.exception("Storage snapshot failed")
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "rooms": len(self.rooms),
+            "archived_rooms": len(self.rooms_archive),
+            "snapshot_path": str(self.snapshot_path) if self.snapshot_path else None,
+            "snapshots": self._snapshots,
+            "last_snapshot_ms": self._last_snapshot_ms,
+        }
+
+    @staticmethod
+    def _copy_room(room: dict) -> dict:
+        # Participants are the only nested values; everything else is immutable.
+        return {**room, "participants": [dict(participant) for participant in room.get("participants", [])]}
+
+    # Content
+
+    async def load_content(self) -> Tuple[Optional[dict], List[dict], List[dict]]:
+        return (
+            copy.deepcopy(self.intro),
+            [copy.deepcopy(self.stations[station_id]) for station_id in sorted(self.stations)][:14],
+            copy.deepcopy(self.final_prayers[:10]),
+        )
+
+    async def count_stations(self) -> int:
+        return len(self.stations)
+
+    async def sync_content(self, intro: Optional[dict], stations: List[dict], final_prayers: List[dict]) -> None:
+        if intro:
+            self.intro = copy.deepcopy(intro)
+        for station in stations:
+            if station.get("id") is None:
+                continue
+            self.stations[station["id"]] = {**self.stations.get(station["id"], {}), **copy.deepcopy(station)}
+        if final_prayers:
+            self.final_prayers = copy.deepcopy(final_prayers)
+        self._dirty = True
+
+    async def get_seed_digest(self) -> Optional[str]:
+        return self.seed_digest
+
+    async def set_seed_digest(self, digest: str, synced_at: datetime) -> None:
+        self.seed_digest = digest
+        self._dirty = True
+
+    # Rooms
+
+    async def find_room(self, room_id: str, active_only: bool = False) -> Optional[dict]:
+        room = self.rooms.get(room_id)
+        if room is None or (active_only and not room.get("active")):
+            return None
+        return self._copy_room(room)
+
+    async def taken_room_names(self, names: List[Tuple[str, str]]) -> Set[str]:
+        return {
+            normalized
+            for _, normalized in names
+            if any(self.rooms[room_id].get("active") for room_id in self._names.get(normalized, ()))
+        }
+
+    async def insert_room(self, room: dict) -> None:
+        if room["room_id"] in self.rooms:
+            raise DuplicateKeyError(f"duplicate room_id {room['room_id']}")
+        normalized = room.get("name_normalized") or _normalize_name(room["name"])
+        stored = self._copy_room({**room, "name_normalized": normalized})
+        self.rooms[room["room_id"]] = stored
+        self._names.setdefault(normalized, set()).add(stored["room_id"])
+        if stored.get("active"):
+            self._next_expiry = min(self._next_expiry, _utc(stored["expires_at"]))
+        self._dirty = True
+
+    async def insert_rooms(self, rooms: List[dict]) -> Dict[int, str]:
+        errors = {}
+        for position, room in enumerate(rooms):
+            try:
+                await self.insert_room(room)
+            except DuplicateKeyError as exc:
+                errors[position] = str(exc)
+        return errors
+
+    async def update_room(self, room_id: str, fields: dict, only_if: Optional[dict] = None) -> None:
+        room = self.rooms.get(room_id)
+        if room is None or any(room.get(key) != value for key, value in (only_if or {}).items()):
+            return
+        room.update(fields)
+        self._dirty = True
+
+    async def expire_rooms(self, now: datetime) -> None:
+        if now < self._next_expiry:
+            return
+        next_expiry = datetime.max.replace(tzinfo=timezone.utc)
+        for room in self.rooms.values():
+            if not room.get("active"):
+                continue
+            expires_at = _utc(room["expires_at"])
+            if expires_at <= now:
+                room["active"] = False
+                self._dirty = True
+            else:
+                next_expiry = min(next_expiry, expires_at)
+        self._next_expiry = next_expiry
+
+    async def push_participants(self, room_id: str, participants: List[dict]) -> None:
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        room.setdefault("participants", []).extend(dict(participant) for participant in participants)
+        room["participant_count"] = room.get("participant_count", 0) + len(participants)
+        self._dirty = True
+
+    async def pull_participants(self, room_id: str, names: List[str]) -> None:
+        room = self.rooms.get(room_id)
+        if room is None:
+            return
+        leaving = set(names)
+        # Mirrors the Mongo update: the counter drops by len(names) even for unknown names.
+        room["participants"] = [
+            participant for participant in room.get("participants", []) if participant.get("name") not in leaving
+        ]
+        room["participant_count"] = room.get("participant_count", 0) - len(names)
+        self._dirty = True
+
+    async def active_room_entries(self, now: datetime) -> List[dict]:
+        return [
+            {field: room.get(field) for field in DIRECTORY_FIELDS if field in room}
+            for room in self.rooms.values()
+            if room.get("active") and _utc(room["expires_at"]) > now
+        ]
+
+    async def search_rooms(self, name: Optional[str] = None, limit: int = 200) -> List[dict]:
+        rooms = self.rooms.values()
+        if name:
+            try:
+                pattern = re.compile(name, re.IGNORECASE)
+            except re.error:
+                pattern = re.compile(re.escape(name), re.IGNORECASE)
+            rooms = [room for room in rooms if pattern.search(room["name"])]
+        newest = sorted(rooms, key=lambda room: _utc(room["created_at"]), reverse=True)
+        return [self._copy_room(room) for room in newest[:limit]]
+
+    async def archive_rooms(self, cutoff: datetime, limit: int = 500) -> int:
+        archived = [
+            room_id
+            for room_id, room in self.rooms.items()
+            if not room.get("active") and _utc(room["expires_at"]) <= cutoff
+        ][:limit]
+        for room_id in archived:
+            room = self.rooms_archive[room_id] = self.rooms.pop(room_id)
+            self._names[room["name_normalized"]].discard(room_id)
+            if not self._names[room["name_normalized"]]:
+                del self._names[room["name_normalized"]]
+        if archived:
+            self._dirty = True
+        return len(archived)
+
+    # Stats
+
+    async def room_totals(self, start: datetime, end: datetime) -> dict:
+        totals = {"rooms_created": 0, "participants": 0, "rooms_completed": 0}
+        for room in self.rooms.values():
+            if start <= _utc(room["created_at"]) < end:
+                totals["rooms_created"] += 1
+                totals["participants"] += room.get("participant_count", 0)
+                totals["rooms_completed"] += 1 if room.get("completed_at") else 0
+        return totals
+
+    async def count_active_rooms(self, now: datetime) -> int:
+        return sum(1 for room in self.rooms.values() if room.get("active") and _utc(room["expires_at"]) > now)
+
+    async def save_room_stats(self, day: str, stats: dict) -> None:
+        self.room_stats.setdefault(day, {}).update(stats)
+        self._dirty = True
+
+    async def record_peak_active_rooms(self, day: str, active_rooms: int) -> None:
+        if day in self.room_stats:
+            stats = self.room_stats[day]
+            stats["peak_active_rooms"] = max(stats.get("peak_active_rooms", 0), active_rooms)
+            self._dirty = True
+
+    # Scheduler: one process, so the lease only guards against a stale owner.
+
+    async def acquire_lease(self, name: str, owner: str, now: datetime, expires_at: datetime) -> bool:
+        lease = self.leases.get(name)
+        if lease and lease["owner"] != owner and lease["expires_at"] > now:
+            return False
+        self.leases[name] = {"_id": name, "owner": owner, "renewed_at": now, "expires_at": expires_at}
+        return True
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        if self.leases.get(name, {}).get("owner") == owner:
+            del self.leases[name]
+
+    async def get_lease(self, name: str) -> Optional[dict]:
+        lease = self.leases.get(name)
+        return dict(lease) if lease else None
+
+    async def job_states(self, names: Iterable[str]) -> Dict[str, dict]:
+        return {name: dict(self.jobs[name]) for name in names if name in self.jobs}
+
+    async def save_job_state(self, name: str, state: dict) -> None:
+        self.jobs.setdefault(name, {"_id": name}).update(state)
+
+
+def create_storage(backend: str, **options):
+    """Builds the storage named by STORAGE_BACKEND ("mongo" or "memory")."""
+    if backend == "mongo":
+        db = options["client"][options["db_name"]]
+        prefix = options.get("collection_prefix")
+        return MongoStorage(PrefixedDatabase(db, prefix) if prefix else db)
+    if backend == "memory":
+        snapshot_path = options.get("snapshot_path")
+        return MemoryStorage(
+            snapshot_path=Path(snapshot_path) if snapshot_path else None,
+            snapshot_seconds=options.get("snapshot_seconds", 30),
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,221 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import re
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+TENANT_NAME = re.compile(r"^[a-z0-9][a-z0-9-]{0,39}$")
+PATH_PREFIX = "/t/"
+
+current_tenant: ContextVar["Tenant"] = ContextVar("current_tenant")
+
+
+class HashRing:
+    """Consistent hashing of tenant names onto Mongo clusters.
+
+    Each cluster owns ``replicas`` points on the ring, so adding or
+    removing a cluster only moves the tenants that hashed next to its
+    points instead of reshuffling everyone.
+    """
+
+    def __init__(self, nodes: Sequence[str], replicas: int = 128):
+        if not nodes:
+            raise ValueError("HashRing needs at least one node")
+        self.nodes = list(nodes)
+        self._points: List[Tuple[int, str]] = sorted(
+            (self._hash(f"{node}#{replica}"), node) for node in self.nodes for replica in range(replicas)
+        )
+        self._keys = [point for point, _ in self._points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def node_for(self, key: str) -> str:
+        position = bisect.bisect(self._keys, self._hash(key)) % len(self._points)
+        return self._points[position][1]
+
+
+class Tenant:
+    """One parish: its hostnames, content variant, cluster and quotas."""
+
+    def __init__(
+        self,
+        name: str,
+        hosts: Sequence[str] = (),
+        seed_file: Optional[str] = None,
+        cluster: Optional[str] = None,
+        max_active_rooms: int = 0,
+        max_concurrent_requests: int = 0,
+    ):
+        if not TENANT_NAME.match(name):
+            raise ValueError(f"Invalid tenant name: {name!r}")
+        self.name = name
+        self.hosts = [host.lower() for host in hosts]
+        self.seed_file = seed_file
+        # Explicit cluster URL; None lets the hash ring choose.
+        self.cluster = cluster
+        # 0 means no limit, for both quotas.
+        self.max_active_rooms = max_active_rooms
+        self.max_concurrent_requests = max_concurrent_requests
+        self._budget = asyncio.Semaphore(max_concurrent_requests) if max_concurrent_requests else None
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def acquire(self, timeout: float) -> bool:
+        if self._budget is not None:
+            try:
+                await asyncio.wait_for(self._budget.acquire(), timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        if self._budget is not None:
+            self._budget.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_active_rooms": self.max_active_rooms,
+            "max_concurrent_requests": self.max_concurrent_requests,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+
+class TenantRegistry:
+    """Resolves requests to tenants by ``/t/{tenant}`` path prefix, then by host.
+
+    Requests matching neither go to the default tenant, so a single-parish
+    deployment without a tenants file behaves exactly as before.
+    """
+
+    def __init__(self, tenants: Sequence[Tenant], default: str):
+        self.tenants: Dict[str, Tenant] = {}
+        self.hosts: Dict[str, Tenant] = {}
+        for tenant in tenants:
+            if tenant.name in self.tenants:
+                raise ValueError(f"Duplicate tenant: {tenant.name}")
+            self.tenants[tenant.name] = tenant
+            for host in tenant.hosts:
+                if host in self.hosts:
+                    raise ValueError(f"Host {host} is mapped to {self.hosts[host].name} and {tenant.name}")
+                self.hosts[host] = tenant
+        if default not in self.tenants:
+            raise ValueError(f"Default tenant {default!r} is not configured")
+        self.default = self.tenants[default]
+
+    def __iter__(self) -> Iterator[Tenant]:
+        return iter(self.tenants.values())
+
+    def __len__(self) -> int:
+        return len(self.tenants)
+
+    def get(self, name: str) -> Optional[Tenant]:
+        return self.tenants.get(name)
+
+    def resolve(self, host: Optional[str], path: str) -> Tuple[Optional[Tenant], str]:
+        """Returns the tenant (None for an unknown path prefix) and the path without the prefix."""
+        if path.startswith(PATH_PREFIX):
+            name, _, rest = path[len(PATH_PREFIX):].partition("/")
+            return self.tenants.get(name), "/" + rest
+        if host:
+            tenant = self.hosts.get(host.split(":", 1)[0].lower())
+            if tenant is not None:
+                return tenant, path
+        return self.default, path
+
+
+def load_tenants(config_file: Optional[str], default_name: str, defaults: dict) -> TenantRegistry:
+    """Builds the registry from a JSON file of the form::
+
+        {"default": "catedral",
+         "tenants": [{"name": "catedral", "hosts": ["catedral.example.org"],
+                      "seed_file": "via_sacra_catedral.json", "cluster": "mongodb://...",
+                      "max_active_rooms": 500, "max_concurrent_requests": 200}]}
+
+    Quotas missing from a tenant entry come from ``defaults``. The default
+    tenant is added with no hosts when the file does not list it.
+    """
+    config = {}
+    if config_file:
+        config = json.loads(Path(config_file).read_text(encoding="utf-8"))
+    default_name = config.get("default", default_name)
+    tenants = [Tenant(**{**defaults, **entry}) for entry in config.get("tenants", [])]
+    if not any(tenant.name == default_name for tenant in tenants):
+        tenants.insert(0, Tenant(name=default_name, **defaults))
+    return TenantRegistry(tenants, default_name)
+
+
+class TenantMiddleware:
+    """Sets ``current_tenant`` for each request and enforces its concurrency budget.
+
+    The ``/t/{tenant}`` prefix is stripped before routing, so the API is
+    mounted once and serves every tenant. Requests over the tenant's
+    budget wait up to ``queue_timeout`` seconds and then get a 503, which
+    keeps one busy parish from taking every database connection.
+    """
+
+    def __init__(
+        self,
+        app,
+        registry: TenantRegistry,
+        queue_timeout: float = 1.0,
+        unmetered_prefixes: Sequence[str] = ("/api/health",),
+    ):
+        self.app = app
+        self.registry = registry
+        self.queue_timeout = queue_timeout
+        self.unmetered_prefixes = tuple(unmetered_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        host = None
+        for name, value in scope.get("headers", []):
+            if name == b"host":
+                host = value.decode("latin-1")
+                break
+        tenant, path = self.registry.resolve(host, scope["path"])
+        if tenant is None:
+            await _send_json(send, 404, {"detail": "Paróquia não encontrada."})
+            return
+        if scope["path"].startswith(PATH_PREFIX):
+            prefix = (PATH_PREFIX + tenant.name).encode("ascii")
+            raw_path = scope.get("raw_path") or scope["path"].encode("utf-8")
+            scope = {**scope, "path": path, "raw_path": raw_path[len(prefix):] or b"/"}
+        # Preflights cost nothing downstream and must not wait behind real requests.
+        metered = scope["method"] != "OPTIONS" and not path.startswith(self.unmetered_prefixes)
+        if metered and not await tenant.acquire(self.queue_timeout):
+            await _send_json(send, 503, {"detail": "Servidor ocupado. Tente novamente em instantes."})
+            return
+        token = current_tenant.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
+            if metered:
+                tenant.release()
+
+
+async def _send_json(send, status: int, content: dict) -> None:
+    body = json.dumps(content, ensure_ascii=False).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
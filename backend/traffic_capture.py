@@ -0,0 +1,235 @@
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import parse_qsl
+
+from loop_monitor import route_name
+
+
+logger = logging.getLogger(__name__)
+
+# Values under these keys never reach the capture file.
+SCRUBBED_KEYS = {"password", "host_token", "token", "authorization", "secret"}
+# Identifiers replaced by a stable pseudonym so replay can correlate requests.
+PSEUDONYMIZED_KEYS = {"room_id"}
+MAX_BODY_BYTES = 64 * 1024
+
+
+def body_shape(value: Any, pseudonym, key: Optional[str] = None) -> Any:
+    """Keeps structure, numbers and booleans; strings are reduced to their length."""
+    if key in SCRUBBED_KEYS:
+        return {"$scrubbed": True}
+    if key in PSEUDONYMIZED_KEYS and isinstance(value, str):
+        return {"$ref": pseudonym(value)}
+    if isinstance(value, dict):
+        return {name: body_shape(item, pseudonym, name) for name, item in value.items()}
+    if isinstance(value, list):
+        return [body_shape(item, pseudonym) for item in value[:50]]
+    if isinstance(value, str):
+        return {"$s": len(value)}
+    return value
+
+
+class TrafficRecorder:
+    """Writes sanitized request records to rotating gzip'd JSON-lines files.
+
+    The request path only enqueues raw bytes and timings; parsing, scrubbing
+    and compression happen on a writer thread. When the queue is full,
+    records are dropped and counted rather than slowing requests down.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int = 50 * 1024 * 1024,
+        max_files: int = 20,
+        sample_rate: float = 1.0,
+        key: Optional[str] = None,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.sample_rate = sample_rate
+        self._key = (key or secrets.token_hex(16)).encode("utf-8")
+        self._queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = time.perf_counter()
+        # Wall-clock time of _started_at, so captures from several workers can be merged.
+        self._started_epoch = time.time()
+        self._file = None
+        self._file_bytes = 0
+        self._sequence = 0
+        self.recorded = 0
+        self.dropped = 0
+
+    def pseudonym(self, value: str) -> str:
+        return hmac.new(self._key, value.encode("utf-8"), hashlib.sha256).hexdigest()[:12]
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._started_at = time.perf_counter()
+        self._started_epoch = time.time()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def should_record(self) -> bool:
+        return self._thread is not None and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def submit(self, scope: dict, body: bytes, status: int, started: float, finished: float) -> None:
+        record = (
+            started - self._started_at,
+            scope.get("method", ""),
+            route_name(scope).split(" ", 1)[-1],
+            dict(scope.get("path_params") or {}),
+            scope.get("query_string", b""),
+            body,
+            status,
+            finished - started,
+        )
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        last_flush = time.monotonic()
+        while True:
+            try:
+                record = self._queue.get(timeout=1)
+            except queue.Empty:
+                record = ()
+            if record is None:
+                break
+            if record:
+                try:
+                    self._write(self._serialize(record))
+                except Exception:
+                    logger.exception("Failed to write traffic capture record")
+            if self._file is not None and time.monotonic() - last_flush >= 1:
+                self._file.flush()
+                last_flush = time.monotonic()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _serialize(self, record: tuple) -> bytes:
+        offset, method, route, path_params, query_string, body, status, duration = record
+        params = {
+            name: {"$ref": self.pseudonym(str(value))} if name in PSEUDONYMIZED_KEYS else value
+            for name, value in path_params.items()
+        }
+        query = {
+            name: body_shape(_scalar(value), self.pseudonym, name)
+            for name, value in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+        }
+        shape = None
+        if body:
+            try:
+                shape = body_shape(json.loads(body), self.pseudonym)
+            except ValueError:
+                shape = {"$bytes": len(body)}
+        line = {
+            "t": round(offset, 4),
+            "m": method,
+            "r": route,
+            "p": params,
+            "q": query,
+            "b": shape,
+            "s": status,
+            "d": round(duration * 1000, 3),
+        }
+        return (json.dumps(line, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+    def _write(self, line: bytes) -> None:
+        if self._file is None or self._file_bytes >= self.max_bytes:
+            self._rotate()
+        self._file.write(line)
+        self._file_bytes += len(line)
+        self.recorded += 1
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._sequence += 1
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = self.directory / f"capture-{os.getpid()}-{stamp}-{self._sequence:04d}.jsonl.gz"
+        self._file = gzip.open(path, "wb", compresslevel=5)
+        self._file_bytes = 0
+        # Offsets ("t") count from the recorder start in every file; "epoch" is that start.
+        header = {"capture": 2, "started_at": stamp, "pid": os.getpid(), "epoch": round(self._started_epoch, 6)}
+        self._file.write((json.dumps(header) + "\n").encode("utf-8"))
+        files = sorted(self.directory.glob(f"capture-{os.getpid()}-*.jsonl.gz"))
+        for old in files[: max(0, len(files) - self.max_files)]:
+            old.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            "directory": str(self.directory),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+        }
+
+
+def _scalar(value: str) -> Any:
+    # Query values arrive as strings; keep numbers as numbers so replays stay valid.
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+class TrafficCaptureMiddleware:
+    def __init__(self, app, recorder: TrafficRecorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.recorder.should_record():
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        chunks = []
+        size = 0
+        status = 0
+
+        async def capture_receive():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request" and size < MAX_BODY_BYTES:
+                chunk = message.get("body", b"")
+                chunks.append(chunk)
+                size += len(chunk)
+            return message
+
+        async def capture_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            body = b"".join(chunks) if size <= MAX_BODY_BYTES else b""
+            self.recorder.submit(scope, body, status, started, time.perf_counter())
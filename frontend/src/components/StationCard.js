@@ -1,15 +1,32 @@
 import React from 'react';
 import { Card, CardContent, CardHeader } from '@/components/ui/card';
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
+// Variants are served by the backend under /api/images; original URLs are absolute.
+const resolveImageUrl = (url) => (url && url.startsWith('/') ? `${BACKEND_URL}${url}` : url);
+
+const buildSrcSet = (variants, format) =>
+  variants
+    .filter((variant) => variant.format === format)
+    .map((variant) => `${resolveImageUrl(variant.url)} ${variant.width}w`)
+    .join(', ');
+
 const StationCard = ({ station }) => {
   const [imageLoaded, setImageLoaded] = React.useState(false);
   if (!station) return null;
 
+  const variants = station.image_variants || [];
+  const imageSizes = '(min-width: 768px) 768px, 100vw';
+
   return (
     <Card className="w-full shadow-lg border-border" data-testid="station-card">
       <CardHeader className="p-0">
-        <div className="relative w-full h-64 overflow-hidden rounded-t-lg">
-          {!imageLoaded && (
+        <div
+          className="relative w-full h-64 overflow-hidden rounded-t-lg bg-cover bg-center"
+          style={station.image_placeholder ? { backgroundImage: `url(${station.image_placeholder})` } : undefined}
+        >
+          {!imageLoaded && !station.image_placeholder && (
             <div className="absolute inset-0 flex items-center justify-center bg-muted/40">
               <div
                 className="h-6 w-6 rounded-full border-2 border-muted-foreground/30 border-t-muted-foreground/60 animate-spin"
@@ -17,16 +34,28 @@ const StationCard = ({ station }) => {
               />
             </div>
           )}
-          <img
-            src={station.image_url}
-            alt={station.title}
-            className={`w-full h-full object-cover transition-opacity duration-300 ${
-              imageLoaded ? 'opacity-100' : 'opacity-0'
-            }`}
-            data-testid="station-image"
-            onLoad={() => setImageLoaded(true)}
-            onError={() => setImageLoaded(true)}
-          />
+          <picture>
+            {['avif', 'webp'].map((format) => {
+              const srcSet = buildSrcSet(variants, format);
+              return srcSet ? (
+                <source key={format} type={`image/${format}`} srcSet={srcSet} sizes={imageSizes} />
+              ) : null;
+            })}
+            <img
+              src={resolveImageUrl(station.image_url)}
+              srcSet={buildSrcSet(variants, 'jpeg') || undefined}
+              sizes={variants.length ? imageSizes : undefined}
+              width={station.image_width || undefined}
+              height={station.image_height || undefined}
+              alt={station.title}
+              className={`w-full h-full object-cover transition-opacity duration-300 ${
+                imageLoaded ? 'opacity-100' : 'opacity-0'
+              }`}
+              data-testid="station-image"
+              onLoad={() => setImageLoaded(true)}
+              onError={() => setImageLoaded(true)}
+            />
+          </picture>
         </div>
       </CardHeader>
       
@@ -0,0 +1,40 @@
+import inspect
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Backend modules import each other as top-level modules (uvicorn runs from backend/).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+# ``server`` builds its storage and admin settings at import time.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("ADMIN_ALLOWED_EMAIL", "admin@example.org")
+os.environ.setdefault("ADMIN_PASSWORD", "admin-pw")
+os.environ.setdefault("ROOM_PASSWORD_BCRYPT_ROUNDS", "4")
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pycollect_makeitem(collector, name, obj):
+    # Runs before the anyio plugin's hook, so every ``async def test_*`` gets its event loop.
+    if collector.istestfunction(obj, name) and inspect.iscoroutinefunction(obj):
+        pytest.mark.anyio(obj)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def api(monkeypatch):
+    """A client for the app with its startup and shutdown hooks run around the test."""
+    import server
+    from password_hashing import PasswordHashExecutor
+
+    # Shutdown stops the hashing pool; give each app run its own.
+    monkeypatch.setattr(server, "password_hasher", PasswordHashExecutor(max_workers=2))
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+            yield client
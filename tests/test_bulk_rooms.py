@@ -0,0 +1,122 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+def room_item(name, starts_in=timedelta(hours=1), **fields):
+    return {
+        "name": name,
+        "password": "abcd",
+        "first_name": "Ana",
+        "last_name": "Lima",
+        "starts_at": (datetime.now(timezone.utc) + starts_in).isoformat(),
+        **fields,
+    }
+
+
+@pytest.fixture
+async def admin(api):
+    response = await api.post(
+        "/api/admin/login",
+        json={"email": server._admin_allowed_email(), "password": "admin-pw"},
+    )
+    api.headers["Authorization"] = f"Bearer {response.json()['token']}"
+    return api
+
+
+@pytest.fixture
+def prefix():
+    # The app's storage outlives a single test; keep room names apart.
+    return uuid.uuid4().hex[:8]
+
+
+def state():
+    return server.tenant_states[server.tenants.default.name]
+
+
+async def create(admin, items):
+    response = await admin.post("/api/admin/rooms/bulk", json={"rooms": items})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_invalid_items_fail_alone(admin, prefix):
+    starts_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    body = await create(admin, [
+        "not a room",
+        {"name": f"{prefix} sem senha", "first_name": "Ana", "last_name": "Lima", "starts_at": starts_at.isoformat()},
+        room_item(f"{prefix} curta", password="abc"),
+        room_item(f"{prefix} passada", starts_in=-timedelta(minutes=1)),
+        room_item(f"{prefix} invertida", expires_at=(starts_at - timedelta(hours=1)).isoformat()),
+        room_item(f"{prefix} valida"),
+    ])
+    errors = [result["error"] for result in body["results"]]
+    assert errors[0] == "O item deve ser um objeto JSON."
+    assert errors[1].startswith("password:")
+    assert errors[2].startswith("password:")
+    assert errors[3] == "O início deve ser no futuro."
+    assert errors[4] == "A expiração deve ser posterior ao início."
+    assert errors[5] is None
+    assert (body["created"], body["failed"]) == (1, 5)
+    assert [result["index"] for result in body["results"]] == list(range(6))
+
+
+async def test_name_clashes_and_the_quota_cutoff(admin, prefix, monkeypatch):
+    created = await admin.post("/api/rooms", json={
+        "name": f"{prefix} existente", "password": "abcd", "first_name": "Rui", "last_name": "Reis",
+    })
+    assert created.status_code == 200
+    active = await state().storage.count_active_rooms(datetime.now(timezone.utc))
+    monkeypatch.setattr(state().tenant, "max_active_rooms", active + 2)
+
+    body = await create(admin, [
+        room_item(f"{prefix} um"),
+        room_item(f"{prefix.upper()}  UM"),
+        room_item(f"{prefix} existente"),
+        room_item(f"{prefix} dois"),
+        room_item(f"{prefix} tres"),
+        room_item(f"{prefix} quatro"),
+    ])
+    assert [(result["created"], result["error"]) for result in body["results"]] == [
+        (True, None),
+        (False, "Nome de sala repetido no lote."),
+        (False, "Esse nome de sala já existe."),
+        (True, None),
+        (False, "Limite de salas ativas desta paróquia atingido."),
+        (False, "Limite de salas ativas desta paróquia atingido."),
+    ]
+
+
+async def test_insert_failures_map_back_to_their_item(admin, prefix, monkeypatch):
+    storage = state().storage
+    insert_rooms = storage.insert_rooms
+
+    async def insert_with_a_taken_id(rooms):
+        # Another writer took the second new room's id first.
+        await storage.insert_room({**rooms[1], "name": f"{prefix} outra", "name_normalized": None, "active": False})
+        return await insert_rooms(rooms)
+
+    monkeypatch.setattr(storage, "insert_rooms", insert_with_a_taken_id)
+    body = await create(admin, [
+        room_item(f"{prefix} passada", starts_in=-timedelta(minutes=1)),
+        room_item(f"{prefix} a"),
+        room_item(f"{prefix} b"),
+        room_item(f"{prefix} c"),
+    ])
+    results = body["results"]
+    assert [result["created"] for result in results] == [False, True, False, True]
+    assert results[2]["error"].startswith("duplicate room_id")
+    assert results[2]["room_id"] is None and results[2]["host_token"] is None
+
+
+async def test_created_rooms_are_listed(admin, prefix):
+    body = await create(admin, [room_item(f"{prefix} lista a"), room_item(f"{prefix} lista b")])
+    room_ids = {result["room_id"] for result in body["results"]}
+    assert all(result["host_token"] for result in body["results"])
+
+    response = await admin.get("/api/rooms", params={"q": prefix})
+    assert response.status_code == 200
+    assert {room["room_id"] for room in response.json()} == room_ids
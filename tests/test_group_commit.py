@@ -0,0 +1,118 @@
+import asyncio
+
+from group_commit import RoomWriteBatcher, WriteCommittedError
+
+
+class FakeRoomStore:
+    def __init__(self, fail_leaves=False, fail_loads=False):
+        self.calls = []
+        self.participants = {}
+        self.fail_leaves = fail_leaves
+        self.fail_loads = fail_loads
+
+    async def apply_joins(self, room_id, participants):
+        self.calls.append(("join", room_id, [participant["name"] for participant in participants]))
+        self.participants.setdefault(room_id, []).extend(participant["name"] for participant in participants)
+
+    async def apply_leaves(self, room_id, names):
+        self.calls.append(("leave", room_id, list(names)))
+        if self.fail_leaves:
+            raise RuntimeError("write failed")
+        self.participants[room_id] = [name for name in self.participants.get(room_id, []) if name not in names]
+
+    async def load_room(self, room_id):
+        self.calls.append(("load", room_id))
+        if self.fail_loads:
+            raise RuntimeError("read failed")
+        return {"room_id": room_id, "participants": list(self.participants.get(room_id, []))}
+
+    def batcher(self, **options):
+        return RoomWriteBatcher(self.apply_joins, self.apply_leaves, self.load_room, **options)
+
+
+async def test_runs_of_joins_and_leaves_are_applied_in_order_with_one_read():
+    store = FakeRoomStore()
+    batcher = store.batcher(window=0.01)
+    results = await asyncio.gather(
+        batcher.join("r", {"name": "Ana"}),
+        batcher.join("r", {"name": "Rui"}),
+        batcher.leave("r", "Ana"),
+        batcher.join("s", {"name": "Eva"}),
+        batcher.join("r", {"name": "Lia"}),
+    )
+
+    assert store.calls == [
+        ("join", "r", ["Ana", "Rui"]),
+        ("leave", "r", ["Ana"]),
+        ("join", "r", ["Lia"]),
+        ("load", "r"),
+        ("join", "s", ["Eva"]),
+        ("load", "s"),
+    ]
+    room = {"room_id": "r", "participants": ["Rui", "Lia"]}
+    assert results == [room, room, room, {"room_id": "s", "participants": ["Eva"]}, room]
+    stats = batcher.stats()
+    assert (stats["batches"], stats["operations"], stats["writes"], stats["largest_batch"]) == (2, 5, 4, 4)
+    assert stats["pending_rooms"] == 0
+
+
+async def test_a_failed_write_fails_its_run_and_later_ones_only():
+    store = FakeRoomStore(fail_leaves=True)
+    batcher = store.batcher(window=0.01)
+    results = await asyncio.gather(
+        batcher.join("r", {"name": "Ana"}),
+        batcher.join("r", {"name": "Rui"}),
+        batcher.leave("r", "Ana"),
+        batcher.join("r", {"name": "Eva"}),
+        return_exceptions=True,
+    )
+    # The first run was written: its callers get the room as it stands, not the error.
+    room = {"room_id": "r", "participants": ["Ana", "Rui"]}
+    assert results[:2] == [room, room]
+    assert [type(result) for result in results[2:]] == [RuntimeError, RuntimeError]
+    assert results[2] is results[3]
+    assert store.calls == [("join", "r", ["Ana", "Rui"]), ("leave", "r", ["Ana"]), ("load", "r")]
+
+    room = await batcher.join("r", {"name": "Lia"})
+    assert room["participants"] == ["Ana", "Rui", "Lia"]
+
+
+async def test_a_failure_in_the_first_run_skips_the_read():
+    store = FakeRoomStore(fail_leaves=True)
+    batcher = store.batcher(window=0.01)
+    results = await asyncio.gather(batcher.leave("r", "Ana"), batcher.join("r", {"name": "Rui"}), return_exceptions=True)
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert store.calls == [("leave", "r", ["Ana"])]
+
+
+async def test_written_callers_get_a_distinct_error_when_the_read_fails():
+    store = FakeRoomStore(fail_loads=True)
+    batcher = store.batcher(window=0.01)
+    results = await asyncio.gather(batcher.join("r", {"name": "Ana"}), batcher.join("r", {"name": "Rui"}), return_exceptions=True)
+    assert [type(result) for result in results] == [WriteCommittedError, WriteCommittedError]
+    assert isinstance(results[0].__cause__, RuntimeError)
+    assert store.participants["r"] == ["Ana", "Rui"]
+
+
+async def test_full_batch_is_flushed_without_waiting_for_the_window():
+    store = FakeRoomStore()
+    batcher = store.batcher(window=60, max_batch=2)
+    first = await asyncio.wait_for(
+        asyncio.gather(batcher.join("r", {"name": "Ana"}), batcher.join("r", {"name": "Rui"})),
+        timeout=1,
+    )
+    assert first[0]["participants"] == ["Ana", "Rui"]
+    assert store.calls == [("join", "r", ["Ana", "Rui"]), ("load", "r")]
+    assert batcher.stats()["pending_rooms"] == 0
+
+
+async def test_cancelled_caller_does_not_affect_the_rest_of_the_batch():
+    store = FakeRoomStore()
+    batcher = store.batcher(window=0.01)
+    impatient = asyncio.create_task(batcher.join("r", {"name": "Ana"}))
+    patient = asyncio.create_task(batcher.join("r", {"name": "Rui"}))
+    await asyncio.sleep(0)
+    impatient.cancel()
+    room = await patient
+    # The write was already queued, so the cancelled join is still applied.
+    assert room["participants"] == ["Ana", "Rui"]
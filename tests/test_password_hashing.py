@@ -0,0 +1,66 @@
+import asyncio
+import threading
+
+import pytest
+from passlib.hash import bcrypt, hex_sha256
+
+from password_hashing import PasswordHashExecutor, PasswordHashQueueFull, hash_room_password, verify_room_password
+
+
+def test_legacy_hashes_verify_and_are_upgraded():
+    for legacy in (hex_sha256.hash("abcd"), bcrypt.using(rounds=4).hash("abcd")):
+        valid, new_hash = verify_room_password("abcd", legacy)
+        assert valid
+        assert new_hash.startswith("$bcrypt-sha256$")
+        assert verify_room_password("abcd", new_hash) == (True, "")
+        assert verify_room_password("abce", legacy) == (False, "")
+
+
+def test_long_passwords_do_not_collide_with_their_72_byte_prefix():
+    password_hash = hash_room_password("x" * 72 + "y")
+    assert verify_room_password("x" * 72 + "y", password_hash) == (True, "")
+    assert verify_room_password("x" * 72, password_hash) == (False, "")
+    assert verify_room_password("x" * 72 + "z", password_hash) == (False, "")
+
+
+async def test_submissions_past_max_pending_are_rejected():
+    executor = PasswordHashExecutor(max_workers=1, max_pending=2)
+    release = threading.Event()
+    try:
+        tasks = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+        while executor.stats()["running"] == 0:
+            await asyncio.sleep(0.01)
+        assert executor.stats()["queued"] == 1
+        with pytest.raises(PasswordHashQueueFull):
+            await executor.run(release.wait)
+        release.set()
+        assert await asyncio.gather(*tasks) == [True, True]
+        stats = executor.stats()
+        assert (stats["queued"], stats["running"], stats["completed"], stats["rejected"]) == (0, 0, 2, 1)
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+async def test_login_rewrites_a_legacy_hash_unless_it_changed_meanwhile():
+    import server
+
+    storage = server.tenant_state().storage
+    legacy = hex_sha256.hash("abcd")
+    for room_id in ("legacy-login", "legacy-race"):
+        await storage.insert_room({"room_id": room_id, "name": room_id, "password_hash": legacy, "active": False})
+
+    room = await storage.find_room("legacy-login")
+    assert not await server.check_room_password(room, "abce")
+    assert (await storage.find_room("legacy-login"))["password_hash"] == legacy
+    assert await server.check_room_password(room, "abcd")
+    upgraded = (await storage.find_room("legacy-login"))["password_hash"]
+    assert upgraded.startswith("$bcrypt-sha256$")
+    assert verify_room_password("abcd", upgraded) == (True, "")
+
+    # The host reset the password while this login was verifying the old one.
+    stale = await storage.find_room("legacy-race")
+    reset = hash_room_password("nova")
+    await storage.update_room("legacy-race", {"password_hash": reset})
+    assert await server.check_room_password(stale, "abcd")
+    assert (await storage.find_room("legacy-race"))["password_hash"] == reset
@@ -0,0 +1,35 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from profiler import ProfilerBusy, SamplingProfiler
+
+
+async def test_profile_samples_the_loop_thread():
+    profiler = SamplingProfiler()
+    result = await profiler.profile(threading.get_ident(), 0.1, 0.005)
+    assert result["samples"] > 0
+    assert "route:-" in result["collapsed"]
+
+
+async def test_cancelled_profile_stops_sampling_and_frees_the_profiler():
+    loop_errors = []
+    asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+    profiler = SamplingProfiler()
+    request = asyncio.create_task(profiler.profile(threading.get_ident(), 30, 0.005))
+    await asyncio.sleep(0.1)
+    with pytest.raises(ProfilerBusy):
+        await profiler.profile(threading.get_ident(), 1, 0.005)
+
+    cancelled_at = time.perf_counter()
+    request.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await request
+    while profiler._lock.locked():
+        assert time.perf_counter() - cancelled_at < 1
+        await asyncio.sleep(0.01)
+    # Let the sampler thread's callback run against the cancelled future.
+    await asyncio.sleep(0.05)
+    assert loop_errors == []
@@ -0,0 +1,63 @@
+import gzip
+import json
+
+from replay_traffic import load_records
+
+
+def write_capture(path, header, offsets):
+    with gzip.open(path, "wt", encoding="utf-8") as capture:
+        capture.write(json.dumps(header) + "\n")
+        for offset in offsets:
+            capture.write(json.dumps({"t": offset, "m": "GET", "r": f"/api/{path.stem}"}) + "\n")
+    return str(path)
+
+
+def test_rotated_files_keep_their_offsets_and_workers_are_merged(tmp_path):
+    # Offsets run from the recorder start across rotations; the second worker started 0.5s later.
+    paths = [
+        write_capture(tmp_path / "a1.jsonl.gz", {"capture": 2, "epoch": 1000.0}, [0.3, 0.9]),
+        write_capture(tmp_path / "a2.jsonl.gz", {"capture": 2, "epoch": 1000.0}, [1.4]),
+        write_capture(tmp_path / "b1.jsonl.gz", {"capture": 2, "epoch": 1000.5}, [0.2, 0.6]),
+    ]
+    records = load_records(paths)
+    assert [(record["t"], record["r"]) for record in records] == [
+        (0.0, "/api/a1.jsonl"),
+        (0.4, "/api/b1.jsonl"),
+        (0.6, "/api/a1.jsonl"),
+        (0.8, "/api/b1.jsonl"),
+        (1.1, "/api/a2.jsonl"),
+    ]
+
+
+def test_version_1_files_are_aligned_by_their_open_time(tmp_path):
+    paths = [
+        write_capture(tmp_path / "a.jsonl.gz", {"capture": 1, "started_at": "20260301T120000", "pid": 1}, [5.0, 6.0]),
+        write_capture(tmp_path / "b.jsonl.gz", {"capture": 1, "started_at": "20260301T120002", "pid": 2}, [0.5]),
+        write_capture(tmp_path / "empty.jsonl.gz", {"capture": 1, "started_at": "20260301T120003", "pid": 3}, []),
+    ]
+    assert [record["t"] for record in load_records(paths)] == [0.0, 1.0, 2.0]
+
+
+def test_unfinished_capture_keeps_the_records_written_so_far(tmp_path):
+    # A live (or killed) worker's current file has been flushed but never closed.
+    live = tmp_path / "live.jsonl.gz"
+    with gzip.open(live, "wb") as capture:
+        capture.write(json.dumps({"capture": 2, "epoch": 1000.0}).encode() + b"\n")
+        for offset in (0.1, 0.2, 0.3):
+            capture.write(json.dumps({"t": offset, "m": "GET", "r": "/api/live"}).encode() + b"\n")
+        capture.flush()
+        unfinished = tmp_path / "unfinished.jsonl.gz"
+        unfinished.write_bytes(live.read_bytes())
+    cut = tmp_path / "cut.jsonl.gz"
+    cut.write_bytes(unfinished.read_bytes()[:-6])
+    finished = write_capture(tmp_path / "done.jsonl.gz", {"capture": 2, "epoch": 1000.0}, [0.15])
+
+    records = load_records([str(unfinished), finished])
+    assert [(record["t"], record["r"]) for record in records] == [
+        (0.0, "/api/live"),
+        (0.05, "/api/done.jsonl"),
+        (0.1, "/api/live"),
+        (0.2, "/api/live"),
+    ]
+    # Cut inside the compressed data: the record it ends in is dropped, the earlier ones kept.
+    assert [record["t"] for record in load_records([str(cut)])] == [0.0, 0.1]
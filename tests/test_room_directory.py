@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from room_directory import InvalidCursor, RoomDirectory
+
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def entry(room_id, name, minutes_ago=0, expires_in=60):
+    return {
+        "room_id": room_id,
+        "name": name,
+        "name_normalized": name.lower(),
+        "created_at": NOW - timedelta(minutes=minutes_ago),
+        "starts_at": NOW - timedelta(minutes=minutes_ago),
+        "expires_at": NOW + timedelta(minutes=expires_in),
+    }
+
+
+def directory_with(entries):
+    async def load_entries():
+        return entries
+
+    directory = RoomDirectory(load_entries)
+    directory.replace_all(entries)
+    return directory
+
+
+def all_pages(directory, limit, prefix=None):
+    names, cursor = [], None
+    while True:
+        items, cursor = directory.page(limit=limit, cursor=cursor, prefix=prefix, now=NOW)
+        names.append([item["name"] for item in items])
+        if cursor is None:
+            return names
+
+
+def test_pages_newest_first_and_skips_expired_rooms():
+    directory = directory_with(
+        [
+            entry("a", "Alfa", minutes_ago=4),
+            entry("b", "Beta", minutes_ago=3),
+            entry("c", "Gama", minutes_ago=2, expires_in=-1),
+            entry("d", "Delta", minutes_ago=1),
+            entry("e", "Epsilon", minutes_ago=0),
+        ]
+    )
+    assert all_pages(directory, limit=2) == [["Epsilon", "Delta"], ["Beta", "Alfa"]]
+
+
+def test_cursor_survives_writes_between_pages():
+    directory = directory_with([entry(room_id, room_id.upper(), minutes_ago=minutes) for minutes, room_id in enumerate("abcd")])
+    first, cursor = directory.page(limit=2, now=NOW)
+    assert [item["room_id"] for item in first] == ["a", "b"]
+    directory.add(entry("new", "NEW", minutes_ago=-1))
+    directory.remove("c")
+    rest, cursor = directory.page(limit=2, cursor=cursor, now=NOW)
+    assert [item["room_id"] for item in rest] == ["d"]
+    assert cursor is None
+
+
+def test_prefix_search_pages_by_name():
+    directory = directory_with(
+        [
+            entry("1", "Paróquia A"),
+            entry("2", "Pastoral"),
+            entry("3", "Paroquia B"),
+            entry("4", "Paroquia C"),
+            entry("5", "Zelo"),
+        ]
+    )
+    assert all_pages(directory, limit=2, prefix="paroquia") == [["Paroquia B", "Paroquia C"]]
+    assert all_pages(directory, limit=1, prefix="pa") == [["Paroquia B"], ["Paroquia C"], ["Paróquia A"], ["Pastoral"]]
+    assert all_pages(directory, limit=5, prefix="x") == [[]]
+
+
+def test_cursor_from_another_mode_is_rejected():
+    directory = directory_with([entry(room_id, room_id) for room_id in "abc"])
+    _, cursor = directory.page(limit=1, now=NOW)
+    with pytest.raises(InvalidCursor):
+        directory.page(limit=1, cursor=cursor, prefix="a", now=NOW)
+    with pytest.raises(InvalidCursor):
+        directory.page(limit=1, cursor="not-a-cursor", now=NOW)
+
+
+async def test_concurrent_refreshes_share_one_reload_and_keep_local_writes():
+    release = asyncio.Event()
+    loads = []
+
+    async def load_entries():
+        loads.append(True)
+        await release.wait()
+        return [entry("db", "From database")]
+
+    directory = RoomDirectory(load_entries)
+    first = asyncio.create_task(directory.refresh())
+    second = asyncio.create_task(directory.refresh())
+    await asyncio.sleep(0)
+    directory.add(entry("local", "Created meanwhile"))
+    release.set()
+    await asyncio.gather(first, second)
+
+    assert loads == [True]
+    assert directory.loaded
+    assert sorted(item["room_id"] for item in directory.page(now=NOW)[0]) == ["db", "local"]
+
+    # The next refresh starts a new reload.
+    await directory.refresh()
+    assert len(loads) == 2
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_refresh():
+    release = asyncio.Event()
+
+    async def load_entries():
+        await release.wait()
+        return [entry("db", "From database")]
+
+    directory = RoomDirectory(load_entries)
+    impatient = asyncio.create_task(directory.refresh())
+    patient = asyncio.create_task(directory.refresh())
+    await asyncio.sleep(0)
+    impatient.cancel()
+    release.set()
+    await patient
+    assert impatient.cancelled()
+    assert len(directory) == 1
+
+
+async def test_failed_refresh_reaches_every_caller_and_allows_a_retry():
+    attempts = []
+
+    async def load_entries():
+        attempts.append(True)
+        await asyncio.sleep(0)
+        if len(attempts) == 1:
+            raise RuntimeError("database down")
+        return []
+
+    directory = RoomDirectory(load_entries)
+    results = await asyncio.gather(directory.refresh(), directory.refresh(), return_exceptions=True)
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert not directory.loaded
+    await directory.refresh()
+    assert directory.loaded
+    assert len(attempts) == 2
+
+
+def test_prune_scans_only_once_the_earliest_expiry_has_passed():
+    class CountingDict(dict):
+        scans = 0
+
+        def items(self):
+            CountingDict.scans += 1
+            return super().items()
+
+    directory = directory_with([entry("a", "A", expires_in=10), entry("b", "B", expires_in=30)])
+    directory._entries = CountingDict(directory._entries)
+    directory.add(entry("c", "C", expires_in=20))
+
+    for _ in range(100):
+        directory.prune(NOW + timedelta(minutes=9))
+    assert CountingDict.scans == 0
+    assert len(directory) == 3
+
+    directory.prune(NOW + timedelta(minutes=10))
+    assert CountingDict.scans == 1
+    assert sorted(directory._entries) == ["b", "c"]
+    directory.prune(NOW + timedelta(minutes=15))
+    assert CountingDict.scans == 1
+
+    directory.add(entry("d", "D", expires_in=12))
+    directory.prune(NOW + timedelta(minutes=25))
+    assert sorted(directory._entries) == ["b"]
+    assert [item["room_id"] for item in directory.page(now=NOW)[0]] == ["b"]
@@ -0,0 +1,72 @@
+import asyncio
+
+from scheduler import JobScheduler
+from storage import MemoryStorage
+
+
+async def test_only_one_scheduler_holds_the_lease():
+    storage = MemoryStorage()
+    first = JobScheduler(storage, lease_seconds=60)
+    second = JobScheduler(storage, lease_seconds=60)
+    assert await first._renew_lease()
+    assert not await second._renew_lease()
+    assert (await storage.get_lease("scheduler"))["owner"] == first.owner
+
+
+async def test_heartbeat_keeps_the_lease_during_a_long_job():
+    storage = MemoryStorage()
+    leader = JobScheduler(storage, lease_seconds=0.3)
+    standby = JobScheduler(storage, lease_seconds=0.3)
+    finished = []
+
+    @leader.job("slow", interval_seconds=3600)
+    async def slow():
+        for _ in range(10):
+            await asyncio.sleep(0.1)
+            # The lease would have expired twice over without renewals.
+            assert not await standby._renew_lease()
+        finished.append(True)
+
+    assert await leader._renew_lease()
+    await leader._run_with_heartbeat()
+    assert finished == [True]
+    assert (await storage.job_states(["slow"]))["slow"]["last_outcome"] == "success"
+
+
+async def test_lost_lease_cancels_the_running_job_and_skips_its_state():
+    storage = MemoryStorage()
+    leader = JobScheduler(storage, lease_seconds=0.3)
+    usurper = JobScheduler(storage, lease_seconds=60)
+    progress = []
+
+    @leader.job("slow", interval_seconds=3600)
+    async def slow():
+        for step in range(10):
+            progress.append(step)
+            await asyncio.sleep(0.1)
+
+    @leader.job("after", interval_seconds=3600)
+    async def after():
+        progress.append("after")
+
+    assert await leader._renew_lease()
+    # Another worker takes over, as if this one had stalled past its lease.
+    storage.leases["scheduler"]["owner"] = usurper.owner
+    await leader._run_with_heartbeat()
+    assert not leader.is_leader
+    assert len(progress) < 10 and "after" not in progress
+    assert await storage.job_states(["slow", "after"]) == {}
+
+
+async def test_state_is_not_saved_when_the_lease_was_lost_during_the_job():
+    storage = MemoryStorage()
+    leader = JobScheduler(storage, lease_seconds=60)
+    other = JobScheduler(storage, lease_seconds=60)
+
+    @leader.job("quick", interval_seconds=3600)
+    async def quick():
+        storage.leases["scheduler"]["owner"] = other.owner
+
+    assert await leader._renew_lease()
+    await leader.run_job(leader.jobs["quick"])
+    assert await storage.job_states(["quick"]) == {}
@@ -0,0 +1,181 @@
+import asyncio
+import pickle
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from storage import MemoryStorage, MongoStorage
+
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+BACKENDS = ["memory", "mongo"]
+
+
+def open_storage(backend):
+    if backend == "memory":
+        return MemoryStorage()
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return MongoStorage(mongomock_motor.AsyncMongoMockClient(tz_aware=True)["via_sacra_test"])
+
+
+def room(room_id, name, minutes_ago=0, expires_in=60, active=True, participants=("Host",)):
+    return {
+        "room_id": room_id,
+        "name": name,
+        "name_normalized": name.lower(),
+        "created_at": NOW - timedelta(minutes=minutes_ago),
+        "starts_at": NOW - timedelta(minutes=minutes_ago),
+        "expires_at": NOW + timedelta(minutes=expires_in),
+        "active": active,
+        "participant_count": len(participants),
+        "participants": [{"name": participant, "joined_at": NOW} for participant in participants],
+    }
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_content_sync_and_seed_digest(backend):
+    storage = open_storage(backend)
+    assert await storage.load_content() == (None, [], [])
+    stations = [{"id": number, "title": f"Estação {number}"} for number in (2, 1)]
+    await storage.sync_content({"title": "Intro"}, stations + [{"title": "sem id"}], [{"text": "Amém"}])
+    await storage.sync_content(None, [{"id": 1, "subtitle": "Jesus é condenado"}], [])
+
+    intro, loaded, prayers = await storage.load_content()
+    assert intro == {"title": "Intro"}
+    assert loaded == [
+        {"id": 1, "title": "Estação 1", "subtitle": "Jesus é condenado"},
+        {"id": 2, "title": "Estação 2"},
+    ]
+    assert prayers == [{"text": "Amém"}]
+    assert await storage.count_stations() == 2
+
+    assert await storage.get_seed_digest() is None
+    await storage.set_seed_digest("abc", NOW)
+    assert await storage.get_seed_digest() == "abc"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_rooms_are_found_and_names_checked_among_active_rooms(backend):
+    storage = open_storage(backend)
+    await storage.insert_room(room("a", "Sala A"))
+    assert await storage.insert_rooms([room("b", "Sala B"), room("c", "Sala C", active=False)]) == {}
+
+    found = await storage.find_room("a")
+    assert found["name"] == "Sala A"
+    assert [participant["name"] for participant in found["participants"]] == ["Host"]
+    assert await storage.find_room("c", active_only=True) is None
+    assert (await storage.find_room("c"))["active"] is False
+    assert await storage.find_room("missing") is None
+
+    names = [("Sala A", "sala a"), ("Sala C", "sala c"), ("Sala Z", "sala z")]
+    assert await storage.taken_room_names(names) == {"sala a"}
+
+    await storage.update_room("a", {"current_station": 3})
+    await storage.update_room("a", {"current_station": 9}, only_if={"current_station": 1})
+    assert (await storage.find_room("a"))["current_station"] == 3
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_participants_are_pushed_and_pulled(backend):
+    storage = open_storage(backend)
+    await storage.insert_room(room("a", "Sala A"))
+    await storage.push_participants("a", [{"name": "Ana", "joined_at": NOW}, {"name": "Rui", "joined_at": NOW}])
+    await storage.pull_participants("a", ["Host", "Rui"])
+    found = await storage.find_room("a")
+    assert [participant["name"] for participant in found["participants"]] == ["Ana"]
+    assert found["participant_count"] == 1
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_expiry_listing_and_archiving(backend):
+    storage = open_storage(backend)
+    await storage.insert_rooms(
+        [
+            room("old", "Antiga", minutes_ago=90, expires_in=-30),
+            room("new", "Nova", minutes_ago=5),
+            room("newer", "Mais nova", minutes_ago=1),
+        ]
+    )
+    assert await storage.count_active_rooms(NOW) == 2
+    await storage.expire_rooms(NOW)
+    assert (await storage.find_room("old"))["active"] is False
+    entries = await storage.active_room_entries(NOW)
+    assert sorted(entry["room_id"] for entry in entries) == ["new", "newer"]
+    assert set(entries[0]) == {"room_id", "name", "name_normalized", "created_at", "starts_at", "expires_at"}
+
+    assert [found["room_id"] for found in await storage.search_rooms()] == ["newer", "new", "old"]
+    assert [found["room_id"] for found in await storage.search_rooms("nova")] == ["newer", "new"]
+
+    assert await storage.archive_rooms(NOW - timedelta(hours=1)) == 0
+    assert await storage.archive_rooms(NOW) == 1
+    assert await storage.find_room("old") is None
+    assert await storage.taken_room_names([("Antiga", "antiga")]) == set()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_room_totals_and_daily_stats(backend):
+    storage = open_storage(backend)
+    completed = {**room("a", "Sala A", participants=("Host", "Ana")), "completed_at": NOW}
+    await storage.insert_rooms([completed, room("b", "Sala B"), room("c", "Sala C", minutes_ago=60 * 25)])
+    totals = await storage.room_totals(NOW - timedelta(days=1), NOW + timedelta(minutes=1))
+    assert totals == {"rooms_created": 2, "participants": 3, "rooms_completed": 1}
+    assert await storage.room_totals(NOW + timedelta(days=1), NOW + timedelta(days=2)) == {
+        "rooms_created": 0,
+        "participants": 0,
+        "rooms_completed": 0,
+    }
+
+    await storage.record_peak_active_rooms("2026-03-01", 5)
+    await storage.save_room_stats("2026-03-01", {"rooms_created": 2})
+    await storage.record_peak_active_rooms("2026-03-01", 5)
+    await storage.record_peak_active_rooms("2026-03-01", 3)
+    if backend == "memory":
+        assert storage.room_stats["2026-03-01"] == {"rooms_created": 2, "peak_active_rooms": 5}
+    else:
+        stats = await storage.db.room_stats.find_one({"_id": "2026-03-01"})
+        assert (stats["rooms_created"], stats["peak_active_rooms"]) == (2, 5)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_scheduler_lease_and_job_state(backend):
+    storage = open_storage(backend)
+    later = NOW + timedelta(seconds=60)
+    assert await storage.acquire_lease("scheduler", "first", NOW, later)
+    assert await storage.acquire_lease("scheduler", "first", NOW, later)
+    assert not await storage.acquire_lease("scheduler", "second", NOW, later)
+    assert (await storage.get_lease("scheduler"))["owner"] == "first"
+    # An expired lease can be taken over.
+    assert await storage.acquire_lease("scheduler", "second", later, later + timedelta(seconds=60))
+    await storage.release_lease("scheduler", "first")
+    assert (await storage.get_lease("scheduler"))["owner"] == "second"
+    await storage.release_lease("scheduler", "second")
+    assert await storage.get_lease("scheduler") is None
+
+    await storage.save_job_state("archive", {"last_outcome": "success", "consecutive_failures": 0})
+    await storage.save_job_state("archive", {"consecutive_failures": 1})
+    states = await storage.job_states(["archive", "rollup"])
+    assert list(states) == ["archive"]
+    assert (states["archive"]["last_outcome"], states["archive"]["consecutive_failures"]) == ("success", 1)
+
+
+async def test_memory_snapshot_round_trip(tmp_path):
+    path = tmp_path / "storage.pickle"
+    storage = MemoryStorage(snapshot_path=path)
+    await storage.start()
+    await storage.insert_room(room("a", "Sala A"))
+    await storage.save_room_stats("2026-03-01", {"rooms_created": 1})
+    snapshot = asyncio.create_task(storage.snapshot())
+    await asyncio.sleep(0)
+    # Written while the snapshot is pickled off the loop: not part of it, but of the next one.
+    await storage.push_participants("a", [{"name": "Ana", "joined_at": NOW}])
+    await snapshot
+    written = pickle.loads(path.read_bytes())
+    assert [participant["name"] for participant in written["rooms"]["a"]["participants"]] == ["Host"]
+    await storage.stop()
+
+    restored = MemoryStorage(snapshot_path=path)
+    await restored.start()
+    assert [participant["name"] for participant in (await restored.find_room("a"))["participants"]] == ["Host", "Ana"]
+    assert await restored.taken_room_names([("Sala A", "sala a")]) == {"sala a"}
+    assert restored.room_stats == {"2026-03-01": {"rooms_created": 1}}
+    await restored.stop()
@@ -0,0 +1,72 @@
+import asyncio
+
+from tenancy import Tenant, TenantMiddleware, TenantRegistry, current_tenant, load_tenants
+
+
+def call(middleware, method, path, headers=()):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "raw_path": path.encode(), "headers": list(headers)}
+    return middleware(scope, receive, send), messages
+
+
+async def echo_tenant(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": f"{current_tenant.get().name} {scope['path']}".encode()})
+
+
+async def test_requests_resolve_by_prefix_then_host():
+    registry = TenantRegistry([Tenant("default"), Tenant("se", hosts=["se.example.org"])], "default")
+    middleware = TenantMiddleware(echo_tenant, registry)
+    for method, path, headers, expected in [
+        ("GET", "/t/se/api/intro", (), (200, b"se /api/intro")),
+        ("GET", "/api/intro", ((b"host", b"SE.example.org:443"),), (200, b"se /api/intro")),
+        ("GET", "/api/intro", (), (200, b"default /api/intro")),
+    ]:
+        request, messages = call(middleware, method, path, headers)
+        await request
+        assert (messages[0]["status"], messages[1]["body"]) == expected
+    request, messages = call(middleware, "GET", "/t/nope/api/intro")
+    await request
+    assert messages[0]["status"] == 404
+
+
+async def test_options_requests_skip_the_concurrency_budget():
+    tenant = Tenant("default", max_concurrent_requests=1)
+    middleware = TenantMiddleware(echo_tenant, TenantRegistry([tenant], "default"), queue_timeout=0.01)
+    assert await tenant.acquire(1)
+
+    request, messages = call(middleware, "OPTIONS", "/api/rooms")
+    await request
+    assert messages[0]["status"] == 200
+
+    request, messages = call(middleware, "GET", "/api/rooms")
+    await request
+    assert messages[0]["status"] == 503
+    assert (tenant.in_flight, tenant.rejected) == (1, 1)
+
+
+async def test_default_tenant_without_a_tenants_file_is_unmetered():
+    registry = load_tenants(None, "default", {})
+    assert registry.default.max_concurrent_requests == 0
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await echo_tenant(scope, receive, send)
+
+    middleware = TenantMiddleware(slow_app, registry, queue_timeout=0.01)
+    requests = [call(middleware, "POST", "/api/rooms/join") for _ in range(300)]
+    tasks = [asyncio.create_task(request) for request, _ in requests]
+    await asyncio.sleep(0.05)
+    assert registry.default.in_flight == 300
+    release.set()
+    await asyncio.gather(*tasks)
+    assert {messages[0]["status"] for _, messages in requests} == {200}
+    assert registry.default.stats()["rejected"] == 0